@@ -3,14 +3,18 @@ import ptvsd
 import os
 
 from bokeh.io import curdoc
-from bokeh.models.widgets import Tabs
 
-from scripts.analyser import analyseAll
+from scripts.analyser import analyseAll, AnalysisOptions
+from scripts.cache import AnalysisCache, DEFAULT_CACHE_DIR
+from scripts.languages import AUTO_LANGUAGES, available_languages
+from scripts.segmentation import SegmentationRules, NEW_CONVERSATION_GAP_MS
 
 # tabs
 from scripts.daily_stats import daily_stats_tab
 from scripts.categorical_stats import categorical_stats_tab
 from scripts.misc_stats import misc_stats_tab
+from scripts.overview_stats import overview_stats_tab
+from scripts.lazy_tabs import LazyTabs
 from bokeh.models.widgets.inputs import Select
 
 # attach to VS Code debugger if this script was run with BOKEH_VS_DEBUG=true
@@ -22,23 +26,63 @@ if 'BOKEH_VS_DEBUG' in os.environ and os.environ['BOKEH_VS_DEBUG'] == 'true':
 
 parser = argparse.ArgumentParser(description='Tool to analyze your Facebook Messenger history')
 parser.add_argument('folder', help='The folder containing Facebook chat messages in JSON format, or a folder of such folders')
+parser.add_argument('--workers', type=int, default=1,
+                    help='Number of worker processes used to analyse conversations in parallel (default: 1)')
+parser.add_argument('--cache-dir', default=DEFAULT_CACHE_DIR,
+                    help=f'Folder where analysed conversations are cached between runs (default: {DEFAULT_CACHE_DIR})')
+parser.add_argument('--cache-size', type=int, default=None,
+                    help='Maximum size of the analysis cache in MB, least recently used conversations are evicted first (default: unlimited)')
+parser.add_argument('--no-cache', action='store_true', help='Analyse all conversations from scratch without using the cache')
+parser.add_argument('--clear-cache', action='store_true', help='Remove all cached conversations once, when the server starts')
+parser.add_argument('--incremental', action='store_true',
+                    help='Only process messages which are not in the cached analysis of a changed conversation, e.g. after downloading a newer export')
+parser.add_argument('--keep-sentiments', action='store_true',
+                    help='Keep the sentiment score of every message in the cache, so that when a conversation has to be analysed again in '
+                    '--incremental mode, e.g. with other options, its messages aren\'t scored again')
+parser.add_argument('--languages', default='english',
+                    help=f'Comma separated languages whose stopwords are left out of the most common words, or {AUTO_LANGUAGES} to detect them '
+                    f'for every conversation. Available: {", ".join(available_languages())} (default: english)')
+parser.add_argument('--max-tracked-words', type=int, default=None,
+                    help='Bound the memory used for word counts by only tracking approximately the most common words, keeping at most '
+                    'this many words of every length per conversation. Implies --no-search-index, since the index keeps every distinct word '
+                    '(default: count every word exactly)')
+parser.add_argument('--no-search-index', action='store_true',
+                    help='Don\'t build the index used to search messages. Saves memory and cache space, but searches scan all messages')
+parser.add_argument('--conversation-gap', type=float, default=NEW_CONVERSATION_GAP_MS / (60*60*1000),
+                    help='Hours without messages after which the next message starts a new conversation (default: 4)')
 
 args = parser.parse_args()
-allConvoStats = analyseAll(args.folder)
 
-# pass the same select object to all tabs so that they synchronise
-# TODO: This approach causes errors about being unable to update object which is no longer in document, probably because the callbacks try to update items in non-active tabs.
-# However, the overall behavior is still as intended, so I'll leave it like this for now.
-conversationTitles = sorted([x.title for x in allConvoStats])
-convoSelection = Select(title='Conversation to analyse: ',
-                        options=conversationTitles, value=conversationTitles[0])
+languages = args.languages
+if languages != AUTO_LANGUAGES:
+    languages = tuple(x.strip() for x in languages.split(',') if x.strip())
+    unknownLanguages = set(languages) - set(available_languages())
+    if unknownLanguages:
+        parser.error(f'No stopwords for languages: {", ".join(sorted(unknownLanguages))}')
+
+cache = None
+if not args.no_cache:
+    # --clear-cache is handled by server_lifecycle.py, since this script runs again for every browser session
+    cache = AnalysisCache(args.cache_dir, args.cache_size)
 
-tab1 = daily_stats_tab(allConvoStats, convoSelection)
-tab2 = categorical_stats_tab(allConvoStats, convoSelection)
-tab3 = misc_stats_tab(allConvoStats, convoSelection)
+options = AnalysisOptions(keepSentiments=args.keep_sentiments, languages=languages,
+                          maxTrackedWords=args.max_tracked_words, searchIndex=not args.no_search_index and args.max_tracked_words is None,
+                          segmentation=SegmentationRules(gapMs=int(args.conversation_gap * 60*60*1000)))
+convoRegistry = analyseAll(args.folder, workers=args.workers, cache=cache, incremental=args.incremental, options=options)
+
+# pass the same select object to all tabs so that they synchronise. Only the visible tab is recomputed when the selection changes,
+# the others are refreshed when they are switched to
+# the options show conversation titles, but the value is the id of the conversation in the registry
+conversationOptions = convoRegistry.select_options()
+convoSelection = Select(title='Conversation to analyse: ',
+                        options=conversationOptions, value=conversationOptions[0][0])
 
 # Put all tabs into one app
-tabs = Tabs(tabs=[tab1, tab2, tab3])
+tabs = LazyTabs(convoSelection)
+tabs.add(*daily_stats_tab(convoRegistry, convoSelection))
+tabs.add(*categorical_stats_tab(convoRegistry, convoSelection))
+tabs.add(*misc_stats_tab(convoRegistry, convoSelection))
+tabs.add(*overview_stats_tab(convoRegistry))
 
 # Put the tabs in the current document for display
-curdoc().add_root(tabs)
+curdoc().add_root(tabs.tabs)
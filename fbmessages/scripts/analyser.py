@@ -1,7 +1,6 @@
-from vaderSentiment.vaderSentiment import SentimentIntensityAnalyzer
-from collections import namedtuple, defaultdict
+from collections import namedtuple, defaultdict, Counter
+from concurrent.futures import ProcessPoolExecutor
 from operator import itemgetter
-from nltk.corpus import stopwords
 from unidecode import unidecode
 
 from bokeh.plotting import figure
@@ -11,13 +10,23 @@ import numpy as np
 import matplotlib.pyplot as plt
 import datetime
 import heapq
-import string
 import time
+import re
 import json
 import copy
 import os
 import glob
 
+from scripts.cache import fingerprint
+from scripts.global_stats import GlobalStats
+from scripts.languages import AUTO_LANGUAGES, available_languages, combined_stopwords, resolve_languages
+from scripts.range_totals import RangeTotals
+from scripts.search_index import SearchIndex
+from scripts.segmentation import SegmentationRules, SessionIndex
+from scripts.sentiment import SentimentEngine
+from scripts.tokenizer import TOKENIZE_CHUNK_SIZE, tokenize, count_words
+from scripts.topwords import BoundedWordFrequencies, top_words_by_min_length
+
 
 class Message:
     def __init__(self, sender, datetime, content):
@@ -28,22 +37,173 @@ class Message:
     def __str__(self):
         return f'{self.sender}: {self.content}'
 
+
+# Columnar storage for the messages with content of a conversation, sorted by time. Indexing returns a Message view of a single
+# message and slicing returns a MessageStore which shares the underlying arrays, so that the tabs can use vectorised operations
+class MessageStore:
+    def __init__(self):
+        self.senders = []  # sender names, indexed by senderIds
+        self.timestamps = np.empty(0, dtype=np.int64)  # Unix timestamps in ms
+        self.days = np.empty(0, dtype=np.int32)  # proleptic Gregorian ordinals of the local dates
+        self.senderIds = np.empty(0, dtype=np.int32)
+        self.wordCounts = np.empty(0, dtype=np.int32)
+        self.sentiments = None  # VADER compound scores, only kept if AnalysisOptions.keepSentiments is set
+        # contents of all messages are stored as one UTF-8 buffer, message i is _contents[_offsets[i]:_offsets[i+1]]
+        self._contents = b''
+        self._offsets = np.zeros(1, dtype=np.int64)
+
+    def __len__(self):
+        return len(self.timestamps)
+
+    def __getitem__(self, key):
+        if isinstance(key, slice):
+            start, stop, step = key.indices(len(self))
+            if step != 1:
+                raise ValueError('MessageStore only supports contiguous slices')
+            stop = max(start, stop)
+            rez = MessageStore()
+            rez.senders = self.senders
+            rez.timestamps = self.timestamps[start:stop]
+            rez.days = self.days[start:stop]
+            rez.senderIds = self.senderIds[start:stop]
+            rez.wordCounts = self.wordCounts[start:stop]
+            rez.sentiments = None if self.sentiments is None else self.sentiments[start:stop]
+            rez._contents = self._contents
+            rez._offsets = self._offsets[start:stop + 1]
+            return rez
+
+        if key < 0:
+            key += len(self)
+        if key < 0 or key >= len(self):
+            raise IndexError('MessageStore index out of range')
+        return Message(self.senders[self.senderIds[key]], datetime.datetime.fromtimestamp(self.timestamps[key] / 1000.0), self.content(key))
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+    # Messages are sorted by time, so the messages sent between the two dates (inclusive) are found with a binary search over the days
+    def between(self, startDate=None, endDate=None):
+        if startDate is None or endDate is None:
+            return self
+        start = np.searchsorted(self.days, startDate.toordinal(), side='left')
+        end = np.searchsorted(self.days, endDate.toordinal(), side='right')
+        return self[start:end]
+
+    # Position of the first message sent on or after the date, or the number of messages if there are none
+    def offset_of(self, date):
+        return int(np.searchsorted(self.days, date.toordinal(), side='left'))
+
+    def content(self, i):
+        return self._contents[self._offsets[i]:self._offsets[i + 1]].decode('utf-8')
+
+    def sender_id(self, sender):
+        return self.senders.index(sender) if sender in self.senders else -1
+
+    # Appends chunks of messages which are newer than the stored ones, oldest chunk first. Every column is concatenated once.
+    # The word counts of the new messages are left at zero for the caller to fill in. Only valid on a store which isn't a slice of another one
+    def extend(self, chunks):
+        if not chunks:
+            return
+        hadMessages = len(self) > 0
+        # Senders get their ids in the order they first appear in the store
+        senderToId = {x: i for i, x in enumerate(self.senders)}
+        senderIds = [self.senderIds]
+        for chunk in chunks:
+            for sender in chunk.senders:
+                if sender not in senderToId:
+                    senderToId[sender] = len(self.senders)
+                    self.senders.append(sender)
+            senderIds.append(np.array([senderToId[x] for x in chunk.senders], dtype=np.int32)[chunk.senderIds])
+        self.timestamps = np.concatenate([self.timestamps] + [x.timestamps for x in chunks])
+        self.days = np.concatenate([self.days] + [x.days for x in chunks])
+        self.senderIds = np.concatenate(senderIds)
+        contentLengths = np.concatenate([x.contentLengths for x in chunks])
+        self.wordCounts = np.concatenate([self.wordCounts, np.zeros(len(contentLengths), dtype=np.int32)])
+        self._offsets = np.concatenate([self._offsets, self._offsets[-1] + np.cumsum(contentLengths)])
+        self._contents = b''.join([self._contents] + [x.contents for x in chunks])
+
+        # Scores are only kept if they are known for every stored message
+        if all(x.sentiments is not None for x in chunks) and (self.sentiments is not None or not hadMessages):
+            previousSentiments = np.empty(0, dtype=np.float32) if self.sentiments is None else self.sentiments
+            self.sentiments = np.concatenate([previousSentiments] + [x.sentiments for x in chunks])
+        else:
+            self.sentiments = None
+
+
+# Columns of consecutive messages in store order, ready to be added to a MessageStore. senderIds index the chunk's own senders,
+# contents is the UTF-8 buffer of all their contents, and contentLengths the length of each in bytes
+MessageChunk = namedtuple('MessageChunk', ['timestamps', 'days', 'senders', 'senderIds', 'contentLengths', 'contents', 'sentiments'])
+
+
+# Packs the columns of messages given newest first into a MessageChunk in store order
+def _pack_messages(timestamps, days, senders, contents, sentiments=None):
+    senderToId = {}
+    senderIds = [senderToId.setdefault(x, len(senderToId)) for x in reversed(senders)]
+    encodedContents = [x.encode('utf-8') for x in reversed(contents)]
+    contentLengths = np.fromiter(map(len, encodedContents), dtype=np.int64, count=len(encodedContents))
+    return MessageChunk(np.array(timestamps[::-1], dtype=np.int64), np.array(days[::-1], dtype=np.int32), list(senderToId),
+                        np.array(senderIds, dtype=np.int32), contentLengths, b''.join(encodedContents),
+                        None if sentiments is None else np.asarray(sentiments[::-1], dtype=np.float32))
+
+
+# Number of most common words shown, and the longest minimum word length they can be asked for
+TOP_WORDS_COUNT = 20
+MAX_TOP_WORDS_MIN_LENGTH = 10
+
+
+# Options which change the result of the analysis. They are part of the cache key, so changing them reanalyses the conversations.
+# languages is a tuple of languages whose stopwords are left out of the word frequencies, or 'auto' to detect them per conversation.
+# If maxTrackedWords is set, only approximately the most common words of every length are counted, see BoundedWordFrequencies.
+# searchIndex builds a SearchIndex of the message contents, without it searches scan the messages.
+# segmentation are the SegmentationRules by which messages are split into conversations
+AnalysisOptions = namedtuple('AnalysisOptions', ['keepSentiments', 'languages', 'maxTrackedWords', 'searchIndex', 'segmentation'],
+                             defaults=[False, ('english',), None, True, SegmentationRules()])
+
+
 class ConvoStats:
-    def __init__(self, title):
+    def __init__(self, title, options=AnalysisOptions()):
+        self.id = None  # folder of the conversation relative to the analysed folder, set by analyseAll
         self.title = title
+        self.options = options
         self.participants = set()
-        self.messages = []
+        self.messages = MessageStore()
         self.dailyCountsBySender = {}
+        # The daily counts as a days x participants matrix, with a row for every day on which messages were sent. The columns
+        # are in the order of participantOrder
+        self.participantOrder = []
+        self.dailyDates = np.empty(0, dtype='datetime64[D]')
+        self.dailyCounts = np.zeros((0, 0), dtype=np.int32)
+        # The monthly counts as a months x participants matrix, with a row for every calendar month from the first message to the last
+        self.monthlyMonths = np.empty(0, dtype='datetime64[M]')
+        self.monthlyCounts = np.zeros((0, 0), dtype=np.int32)
         self.monthlyCountsBySender = {}
         self.dayNameCounts = defaultdict(int)
         self.hourlyCounts = defaultdict(int)
         self.dailySentiments = defaultdict(float)
-        self.wordFrequencies = []
-        
+        self.dailySentimentValues = np.empty(0)  # the daily sentiments for every day of dailyDates
+        self.wordFrequencies = Counter() if options.maxTrackedWords is None else BoundedWordFrequencies(options.maxTrackedWords)
+        # languages whose stopwords are left out of wordFrequencies. Detected languages are only known after the first _finalize,
+        # until then the uses of the stopwords of every language are counted in stopwordCounts, out of wordUseCount counted words
+        self.languages = None if options.languages == AUTO_LANGUAGES else tuple(options.languages)
+        self.stopwordCounts = Counter()
+        self.wordUseCount = 0
+        self.searchIndex = SearchIndex() if options.searchIndex else None
+        self.sessions = None  # SessionIndex of the stored messages, rebuilt by _finalize
+        self.rangeTotals = None  # RangeTotals of the stored messages, rebuilt by _finalize
+        self.topWordsByMinLength = []  # the TOP_WORDS_COUNT most common (word, count) pairs for every minimum word length
+
         self.totalMessages = 0
         self.initiationsBySender = defaultdict(int)
         self.countsBySender = defaultdict(int)
 
+        # State needed to fold messages from a newer export into the existing aggregates
+        self.dailySentimentSums = defaultdict(float)
+        # Time of the newest message and everyone who sent a message at that exact time, so that a newer export can be told
+        # apart from the messages already folded in without remembering every one of them
+        self.lastTimestampMs = None
+        self.lastTimestampSenders = set()
+
     def __str__(self):
         rez = f'Convo: {self.title}, total messages: {self.totalMessages}\n'
         for key, val in sorted(self.countsBySender.items(), key=lambda p: p[1], reverse=True):
@@ -55,84 +215,138 @@ class ConvoStats:
         return rez
 
 
-english_stopwords = set(stopwords.words('english'))
-sentiment_analyzer = SentimentIntensityAnalyzer()
+# Analysed conversations by their id, iterated in the order of decreasing message count
+class ConvoRegistry:
+    def __init__(self, convoStats):
+        self._convos = {x.id: x for x in sorted(convoStats, key=lambda dt: dt.totalMessages, reverse=True)}
+        # Merged from the aggregates of the conversations as they are registered, the messages aren't gone through again
+        self.globalStats = GlobalStats(self)
+
+    def __getitem__(self, convoId):
+        return self._convos[convoId]
+
+    def __contains__(self, convoId):
+        return convoId in self._convos
+
+    def __iter__(self):
+        return iter(self._convos.values())
+
+    def __len__(self):
+        return len(self._convos)
+
+    # (id, title) pairs for a Select widget, sorted by title. Conversations which share a title are told apart by their folder
+    def select_options(self):
+        titleCounts = defaultdict(int)
+        for convo in self:
+            titleCounts[convo.title] += 1
+        labels = [(convo.id, convo.title if titleCounts[convo.title] == 1 else f'{convo.title} ({convo.id})') for convo in self]
+        return sorted(labels, key=lambda x: x[1])
+
 
 # The unicode in the json files is misformatted: https://stackoverflow.com/questions/50004087/converting-unicode-string-to-utf-8
 def parse_utf8(s):
     arr = bytearray(map(ord, s))
     return arr.decode('utf-8')
 
-# loads messages from files in filenames (message files may be split into multiple files)
-def _load_messages(filenames):
-    data = None
-    for filename in filenames:
-        with open(filename) as jsonfile:
-            tData = json.load(jsonfile)
-            if data is None:
-                data = tData
-            else:
-                data['messages'] += tData['messages']
-                
-    # parse unicode
-    data['title'] = parse_utf8(data['title'])
-    
-    for msg in data['messages']:
-        msg['sender_name'] = parse_utf8(msg['sender_name'])
-        if 'content' in msg:
-            msg['content'] = parse_utf8(msg['content'])
-    return data
+# Every byte of a UTF-8 sequence is written out as a separate \u00XX escape. Runs of escapes for bytes >= 0x80 are repaired in the raw
+# json text at once, which gives the same strings as calling parse_utf8 on every decoded string. Escaped backslashes are matched
+# as well, so that an escaped backslash followed by "u00.." is left alone
+_utf8_byte_escapes = re.compile(r'\\\\|(?:\\u00[89a-fA-F][0-9a-fA-F])+')
 
 
-def get_messages(data):
-    # Copy the stored messages we have
-    copied_messages = data['messages']
+def _repair_utf8_escapes(match):
+    escapes = match.group(0)
+    if escapes == '\\\\':
+        return escapes
+    try:
+        return bytes.fromhex(escapes.replace('\\u00', '')).decode('utf-8')
+    except UnicodeDecodeError:
+        # Not a valid UTF-8 sequence, so the escapes are not mojibake and are decoded as is
+        return escapes
 
-    # Return a sorted list of messages by time
-    return sorted(copied_messages, key=lambda message: message['timestamp_ms'])
 
+def fix_mojibake(text):
+    return _utf8_byte_escapes.sub(_repair_utf8_escapes, text)
 
-def analyze(filenames):
-    # Load messages
-    print(f'Reading files {filenames} ...')
-    timestamp = time.perf_counter()
-    data = _load_messages(filenames)
-    messages = get_messages(data)
-    print('Loaded {0} messages in {1:.2f} seconds.'.format(
-        len(messages), time.perf_counter() - timestamp))
+_json_decoder = json.JSONDecoder()
+_json_whitespace = re.compile(r'[ \t\n\r]*')
 
-    # To avoid issues, convos with <10 messages will be ignored
-    if len(messages) < 10:
-        # TODO: Commented this out due to some bogus encoding error, investigate later
-        # TODO: (Might go away if I fix my data encodings right after reading it, it's a mess rn)
-        # print(f'Conversation {data["title"]} is ignored due to small size')
-        return None
 
-    print('Aggregating data ...')
-    timestamp = time.perf_counter()
+def _skip_whitespace(text, pos):
+    return _json_whitespace.match(text, pos).end()
+
 
-    # Data structures to hold information about the messages
-    processedMessages = []
-    countsBySender = defaultdict(int)
-    initiationsBySender = defaultdict(int)
-    daily_counts = defaultdict(int)
-
-    dailyCountsBySender = {}
-    monthlyCountsBySender = {}
-
-    daily_sticker_counts = defaultdict(int)
-    daily_sentiments = defaultdict(float)
-    monthly_sticker_counts = defaultdict(int)
-    hourly_counts = defaultdict(int)
-    day_name_counts = defaultdict(int)
-    word_frequencies = defaultdict(int)
-    first_date = None
-    last_date = None
-    participants = set()
-
-    # Extract information from the messages
-    for id, message in enumerate(messages):
-        participants.add(message['sender_name'])
+def _expect(text, pos, char, filename):
+    if pos >= len(text) or text[pos] != char:
+        raise json.JSONDecodeError(f'Expecting \'{char}\' in {filename}', text, pos)
+    return _skip_whitespace(text, pos + 1)
+
+
+# Yields the messages of a single message file one at a time, in the order they are stored (newest first).
+# Only the raw text of the file is kept in memory, each message is decoded when it is requested.
+# The other top level fields of the file (title, participants, ...) are stored in header as they are encountered
+def _iter_message_file(filename, header):
+    with open(filename, encoding='utf-8') as jsonfile:
+        text = fix_mojibake(jsonfile.read())
+
+    pos = _expect(text, _skip_whitespace(text, 0), '{', filename)
+    while pos < len(text) and text[pos] != '}':
+        key, pos = _json_decoder.raw_decode(text, pos)
+        pos = _expect(text, _skip_whitespace(text, pos), ':', filename)
+        if key == 'messages':
+            pos = _expect(text, pos, '[', filename)
+            while text[pos] != ']':
+                message, pos = _json_decoder.raw_decode(text, pos)
+                yield message
+                pos = _skip_whitespace(text, pos)
+                if text[pos] == ',':
+                    pos = _skip_whitespace(text, pos + 1)
+            pos += 1
+        else:
+            value, pos = _json_decoder.raw_decode(text, pos)
+            header.setdefault(key, value)
+        pos = _skip_whitespace(text, pos)
+        if pos < len(text) and text[pos] == ',':
+            pos = _skip_whitespace(text, pos + 1)
+    _expect(text, pos, '}', filename)
+
+
+# Yields messages from files in filenames (message files may be split into multiple files), newest first.
+# Every file is already sorted newest first, so a k-way merge is enough to sort the whole conversation.
+# The merge needs the first message of every file up front, so the raw text of all files of the conversation is read at once and
+# only released file by file as they run out. What streaming saves are the decoded messages: they are never all held in memory.
+# header is filled in with the other top level fields once all messages have been consumed
+def _iter_messages(filenames, header):
+    fileIterators = [_iter_message_file(filename, header) for filename in filenames]
+    return heapq.merge(*fileIterators, key=itemgetter('timestamp_ms'), reverse=True)
+
+
+# Folds messages into the aggregates of stats. The messages must be sorted newest first and be newer than any message already in stats.
+# knownScores are sentiment scores of contents which don't have to be scored again
+def _accumulate(stats, messages, sentimentEngine, knownScores=None):
+    newestTimestampMs, newestSenders = None, set()
+    # Messages with content are collected newest first, and every TOKENIZE_CHUNK_SIZE of them are scored and packed into a
+    # MessageChunk, so that only one chunk of them is held as Python objects at once
+    chunks = []
+    contentTimestamps, contentDays, contentDayKeys, contentSenders, contents = [], [], [], [], []
+
+    def pack_contents():
+        # Repeated contents are only scored once per chunk, and short ones once per sentiment engine
+        sentiments = sentimentEngine.score(contents, knownScores)
+        for day, sentiment in zip(contentDayKeys, sentiments.tolist()):
+            stats.dailySentimentSums[day] += sentiment
+        chunks.append(_pack_messages(contentTimestamps, contentDays, contentSenders, contents,
+                                    sentiments if stats.options.keepSentiments else None))
+        for column in (contentTimestamps, contentDays, contentDayKeys, contentSenders, contents):
+            column.clear()
+
+    for message in messages:
+        sender = message['sender_name']
+        stats.participants.add(sender)
+        if newestTimestampMs is None:
+            newestTimestampMs = message['timestamp_ms']
+        if message['timestamp_ms'] == newestTimestampMs:
+            newestSenders.add(sender)
         # Convert message's Unix timestamp to local datetime
         date = datetime.datetime.fromtimestamp(message['timestamp_ms']/1000.0)
         month = date.strftime('%Y-%m')
@@ -140,89 +354,157 @@ def analyze(filenames):
         day_name = date.strftime('%A')
         hour = date.time().hour
 
-        # track who initiated the conversations how many times
-        if id == 0:
-            # first message, so conversation initiated
-            initiationsBySender[message['sender_name']] += 1
-        else:
-            timeDiff = date - \
-                datetime.datetime.fromtimestamp(
-                    messages[id-1]['timestamp_ms']/1000.0)
-            # It is assumed that if 4h passed since last message, a new conversation has been initiated
-            hoursPassed = timeDiff.total_seconds() // (60*60)
-            if hoursPassed >= 4:
-                initiationsBySender[message['sender_name']] += 1
-
         # Increment message counts
-        countsBySender[message['sender_name']] += 1
-        hourly_counts[hour] += 1
-        day_name_counts[day_name] += 1
-        daily_counts[day] += 1
-
-        if day not in dailyCountsBySender:
-            dailyCountsBySender[day] = defaultdict(int)
-        dailyCountsBySender[day][message['sender_name']] += 1
+        stats.totalMessages += 1
+        stats.countsBySender[sender] += 1
+        stats.hourlyCounts[hour] += 1
+        stats.dayNameCounts[day_name] += 1
+
+        if day not in stats.dailyCountsBySender:
+            stats.dailyCountsBySender[day] = defaultdict(int)
+        stats.dailyCountsBySender[day][sender] += 1
         
-        if month not in monthlyCountsBySender:
-            monthlyCountsBySender[month] = defaultdict(int)
-        monthlyCountsBySender[month][message['sender_name']] += 1
-
-        if 'sticker' in message:
-            daily_sticker_counts[day] += 1
-            monthly_sticker_counts[month] += 1
+        if month not in stats.monthlyCountsBySender:
+            stats.monthlyCountsBySender[month] = defaultdict(int)
+        stats.monthlyCountsBySender[month][sender] += 1
 
         # Process content of the message if it has any
         if 'content' in message:
             content = message['content']
-            processedMessages.append(Message(message['sender_name'], date, content))
-            # Rudimentary sentiment analysis using VADER
-            sentiments = sentiment_analyzer.polarity_scores(content)
-            daily_sentiments[day] += sentiments['compound']
-
-            # Split message up by spaces to get individual words
-            for word in content.split(' '):
-                # Make the word lowercase and strip it of punctuation
-                new_word = word.lower().strip(string.punctuation)
-
-                # Word might have been entirely punctuation; don't strip it
-                if not new_word:
-                    new_word = word.lower()
-
-                # Ignore word if it in the stopword set or if it is less than 2 characters
-                if len(new_word) > 1 and new_word not in english_stopwords:
-                    word_frequencies[new_word] += 1
-
-        # Determine start and last dates of messages
-        if (first_date and first_date > date) or not first_date:
-            first_date = date
-        if (last_date and last_date < date) or not last_date:
-            last_date = date
+            contentTimestamps.append(message['timestamp_ms'])
+            contentDays.append(date.toordinal())
+            contentDayKeys.append(day)
+            contentSenders.append(sender)
+            contents.append(content)
+            if len(contents) == TOKENIZE_CHUNK_SIZE:
+                pack_contents()
+
+    if newestTimestampMs is None:
+        return
+    if contents:
+        pack_contents()
+    # The chunks were packed newest first, the oldest one is stored first
+    firstPosition = len(stats.messages)
+    stats.messages.extend(chunks[::-1])
+    chunks.clear()
+
+    # Contents are tokenised back from the store in chunks, so that only the words of one chunk are held at once, and they
+    # reach the search index in ascending positions.
+    # Stopwords are never counted as words, they would take up room in bounded word frequencies
+    if stats.languages is None:
+        stopwords, stopwordCounts = combined_stopwords(tuple(available_languages())), stats.stopwordCounts
+    else:
+        stopwords, stopwordCounts = combined_stopwords(stats.languages), None
+    for start in range(firstPosition, len(stats.messages), TOKENIZE_CHUNK_SIZE):
+        end = min(start + TOKENIZE_CHUNK_SIZE, len(stats.messages))
+        tokens = tokenize([stats.messages.content(i) for i in range(start, end)])
+        stats.wordUseCount += count_words(tokens.words, stats.wordFrequencies, stopwords, stopwordCounts)
+        if stats.searchIndex is not None:
+            stats.searchIndex.add(tokens.words, tokens.tokenCounts, start)
+        stats.messages.wordCounts[start:end] = tokens.wordCounts
+
+    if newestTimestampMs != stats.lastTimestampMs:
+        stats.lastTimestampSenders = set()
+    stats.lastTimestampMs = newestTimestampMs
+    stats.lastTimestampSenders |= newestSenders
+
+
+# Recomputes the aggregates that are derived from the accumulated sums
+def _finalize(stats):
+    # Messages are aggregated newest first, but the displays expect the days and months in chronological order
+    stats.dailyCountsBySender = dict(sorted(stats.dailyCountsBySender.items()))
+    stats.monthlyCountsBySender = dict(sorted(stats.monthlyCountsBySender.items()))
+
+    stats.participantOrder = sorted(stats.participants)
+    stats.dailyDates = np.array(list(stats.dailyCountsBySender.keys()), dtype='datetime64[D]')
+    stats.dailyCounts = np.array([[countsBySender.get(x, 0) for x in stats.participantOrder]
+                                  for countsBySender in stats.dailyCountsBySender.values()], dtype=np.int32)
+    stats.sessions = SessionIndex(stats.messages, stats.options.segmentation)
+    # Counted from the same conversations as the statistics of the tabs
+    initiatedSenderIds = stats.messages.senderIds[stats.sessions.starts[stats.sessions.initiations]]
+    initiationCounts = np.bincount(initiatedSenderIds, minlength=len(stats.messages.senders)).tolist()
+    stats.initiationsBySender = defaultdict(int, {sender: count for sender, count in zip(stats.messages.senders, initiationCounts)
+                                                  if count > 0})
+
+    # Months without messages get rows of zeros, so that the monthly chart has no gaps
+    dayMonths = stats.dailyDates.astype('datetime64[M]')
+    if len(dayMonths) > 0:
+        stats.monthlyMonths = np.arange(dayMonths[0], dayMonths[-1] + 1)
+    stats.monthlyCounts = np.zeros((len(stats.monthlyMonths), len(stats.participantOrder)), dtype=np.int32)
+    np.add.at(stats.monthlyCounts, (dayMonths - stats.monthlyMonths[:1]).astype(np.int64), stats.dailyCounts)
+
+    # Languages are detected on the first analysis, later folds keep using them. The stopwords of the other languages are ordinary words
+    if stats.languages is None:
+        stats.languages = resolve_languages(stats.options.languages, stats.stopwordCounts, stats.wordUseCount)
+        ignoredWords = combined_stopwords(stats.languages)
+        stats.wordFrequencies.update({key: val for key, val in stats.stopwordCounts.items() if key not in ignoredWords})
+        stats.stopwordCounts = Counter()
+    stats.topWordsByMinLength = top_words_by_min_length(stats.wordFrequencies, TOP_WORDS_COUNT, MAX_TOP_WORDS_MIN_LENGTH)
 
     # Take the average of the sentiment amassed for each day
-    for day, message_count in daily_counts.items():
-        daily_sentiments[day] /= message_count
+    stats.dailySentiments = defaultdict(float)
+    for day, countsBySender in stats.dailyCountsBySender.items():
+        stats.dailySentiments[day] = stats.dailySentimentSums[day] / sum(countsBySender.values())
+    stats.dailySentimentValues = np.array(list(stats.dailySentiments.values()), dtype=np.float64)
 
-    # Get the number of days the messages span over
-    num_days = max((last_date - first_date).days, 1)
+    stats.rangeTotals = RangeTotals(stats.messages, stats.sessions, stats.dailySentimentSums)
 
-    # Get most common words
-    top_words = heapq.nlargest(42, word_frequencies.items(), key=itemgetter(1))
 
-    print('Processed data in {0:.2f} seconds.'.format(
-        time.perf_counter() - timestamp))
+# sentimentEngine may be shared by the conversations analysed in one run, so that they share its memo
+def analyze(filenames, previousStats=None, options=AnalysisOptions(), sentimentEngine=None):
+    print(f'Reading files {filenames} ...')
+    timestamp = time.perf_counter()
+    header = {}
+    if sentimentEngine is None:
+        sentimentEngine = SentimentEngine()
+
+    # If the conversation was analysed before with the same options, only the messages which weren't seen yet need to be processed
+    if previousStats is not None and previousStats.options == options:
+        # Messages sent after the newest analysed one are new. If all the others are exactly the analysed ones, the newer
+        # export only adds messages at the end
+        lastTimestampMs = previousStats.lastTimestampMs
+        newMessages = []
+        oldMessageCount = 0
+        for message in _iter_messages(filenames, header):
+            if message['timestamp_ms'] > lastTimestampMs or (message['timestamp_ms'] == lastTimestampMs and
+                                                             message['sender_name'] not in previousStats.lastTimestampSenders):
+                newMessages.append(message)
+            else:
+                oldMessageCount += 1
+        if oldMessageCount == previousStats.totalMessages:
+            print(f'Folding {len(newMessages)} new messages into existing analysis ...')
+            previousStats.title = header['title']
+            _accumulate(previousStats, newMessages, sentimentEngine)
+            _finalize(previousStats)
+            return previousStats
+        # Initiations depend on the preceding message, so messages which go back in time require a full rebuild
+        print('Messages before the end of the existing analysis changed, analysing from scratch ...')
+        header = {}
+
+    # A previous analysis which kept the score of every message saves scoring its messages again
+    knownScores = None
+    if previousStats is not None and previousStats.messages.sentiments is not None:
+        previousMessages = previousStats.messages
+        knownScores = dict(zip((previousMessages.content(i) for i in range(len(previousMessages))),
+                               previousMessages.sentiments.tolist()))
+
+    rezStats = ConvoStats(None, options)
+    _accumulate(rezStats, _iter_messages(filenames, header), sentimentEngine, knownScores)
+    rezStats.title = header['title']
+    print('Processed {0} messages in {1:.2f} seconds.'.format(
+        rezStats.totalMessages, time.perf_counter() - timestamp))
+
+    # To avoid issues, convos with <10 messages will be ignored
+    if rezStats.totalMessages < 10:
+        # TODO: Commented this out due to some bogus encoding error, investigate later
+        # TODO: (Might go away if I fix my data encodings right after reading it, it's a mess rn)
+        # print(f'Conversation {data["title"]} is ignored due to small size')
+        return None
 
-    rezStats = ConvoStats(data['title'])
-    rezStats.countsBySender = countsBySender
-    rezStats.initiationsBySender = initiationsBySender
-    rezStats.totalMessages = len(messages)
-    rezStats.dailyCountsBySender = dailyCountsBySender
-    rezStats.monthlyCountsBySender = monthlyCountsBySender
-    rezStats.messages = processedMessages
-    rezStats.participants = participants
-    rezStats.dayNameCounts = day_name_counts
-    rezStats.hourlyCounts = hourly_counts
-    rezStats.dailySentiments = daily_sentiments
-    rezStats.wordFrequencies = word_frequencies
+    _finalize(rezStats)
+
+    # Get most common words
+    top_words = heapq.nlargest(42, rezStats.wordFrequencies.items(), key=itemgetter(1))
 
     print('Preparing data for display ...')
 
@@ -257,12 +539,85 @@ def analyze(filenames):
     return rezStats
 
 
-def analyseAll(folderName):
+# Wraps analyze so that the caller can see which worker processed the folder and how long it took
+def _analyze_timed(filenames, previousStats=None, options=AnalysisOptions(), sentimentEngine=None):
+    timestamp = time.perf_counter()
+    convoStats = analyze(filenames, previousStats, options, sentimentEngine)
+    return convoStats, os.getpid(), time.perf_counter() - timestamp
+
+
+def _find_conversation_files(folderName):
     rez = []
     for dirName, subdirList, fileList in os.walk(folderName):
         messageFiles = glob.glob(os.path.join(dirName, 'message*.json'))
         if len(messageFiles) > 0:
-            convoStats = analyze(messageFiles)
-            if convoStats is not None:
-                rez.append(convoStats)
-    return sorted(rez, key=lambda dt: dt.totalMessages, reverse=True)
+            rez.append(messageFiles)
+    return rez
+
+
+# Conversation folders are named after the conversation and a unique suffix, so their path identifies the conversation even if titles repeat
+def _conversation_id(folderName, convoFolder):
+    convoId = os.path.relpath(convoFolder, folderName)
+    if convoId == '.':
+        convoId = os.path.basename(os.path.abspath(folderName))
+    return convoId.replace(os.sep, '/')
+
+
+def analyseAll(folderName, workers=1, cache=None, incremental=False, options=AnalysisOptions()):
+    conversationFiles = _find_conversation_files(folderName)
+    timestamp = time.perf_counter()
+
+    # Conversations whose message files haven't changed since the last run are loaded from the cache
+    results = [None] * len(conversationFiles)
+    fingerprints = [None] * len(conversationFiles)
+    if cache is not None:
+        for i, messageFiles in enumerate(conversationFiles):
+            fingerprints[i] = (fingerprint(messageFiles), options)
+            hit, convoStats = cache.get(os.path.dirname(messageFiles[0]), fingerprints[i])
+            if hit:
+                results[i] = (convoStats, None, 0.0)
+        print(f'Loaded {sum(x is not None for x in results)} conversations from cache.')
+    toAnalyse = [i for i, x in enumerate(results) if x is None]
+
+    # In incremental mode, changed conversations are updated starting from their previously cached analysis
+    previousStats = [None] * len(toAnalyse)
+    if cache is not None and incremental:
+        previousStats = [cache.get_previous(os.path.dirname(conversationFiles[i][0])) for i in toAnalyse]
+
+    if workers > 1 and len(toAnalyse) > 1:
+        print(f'Analysing {len(toAnalyse)} conversations using {workers} worker processes ...')
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            # map keeps the results in the same order as the folders were found
+            analysed = list(executor.map(_analyze_timed, [conversationFiles[i] for i in toAnalyse], previousStats,
+                                         [options] * len(toAnalyse)))
+    else:
+        # Without conversations to spread over the workers, they are used to score sentiments of the single conversation instead.
+        # The engine is dropped once the run is over, along with the scores it remembered
+        with SentimentEngine(workers) as sentimentEngine:
+            analysed = [_analyze_timed(conversationFiles[i], previous, options, sentimentEngine)
+                        for i, previous in zip(toAnalyse, previousStats)]
+
+    for i, result in zip(toAnalyse, analysed):
+        results[i] = result
+        if cache is not None:
+            cache.put(os.path.dirname(conversationFiles[i][0]), fingerprints[i], result[0])
+    if cache is not None:
+        cache.enforce_size_limit()
+
+    timeByWorker = defaultdict(float)
+    convosByWorker = defaultdict(int)
+    for _, pid, elapsed in analysed:
+        timeByWorker[pid] += elapsed
+        convosByWorker[pid] += 1
+    for pid in sorted(timeByWorker.keys()):
+        print('Worker {0} analysed {1} conversations in {2:.2f} seconds.'.format(
+            pid, convosByWorker[pid], timeByWorker[pid]))
+    print('Analysed all conversations in {0:.2f} seconds.'.format(
+        time.perf_counter() - timestamp))
+
+    rez = []
+    for messageFiles, (convoStats, _, _) in zip(conversationFiles, results):
+        if convoStats is not None:
+            convoStats.id = _conversation_id(folderName, os.path.dirname(messageFiles[0]))
+            rez.append(convoStats)
+    return ConvoRegistry(rez)
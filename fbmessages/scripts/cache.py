@@ -0,0 +1,117 @@
+import hashlib
+import pickle
+import tempfile
+import os
+
+# Bump this whenever the shape of ConvoStats or Message changes, so that entries pickled by an older version are ignored
+CACHE_VERSION = 21
+
+DEFAULT_CACHE_DIR = os.path.join(os.path.expanduser('~'), '.cache', 'fbmessages')
+
+
+# Identifies the exact contents of a conversation folder: if any message file is added, removed or modified, the fingerprint changes
+def fingerprint(filenames):
+    rez = []
+    for filename in sorted(filenames):
+        stat = os.stat(filename)
+        rez.append((os.path.abspath(filename), stat.st_size, stat.st_mtime_ns))
+    return tuple(rez)
+
+
+# Persistent on-disk cache of analysed conversations, one pickle file per conversation folder
+class AnalysisCache:
+    def __init__(self, cacheDir=DEFAULT_CACHE_DIR, maxSizeMb=None):
+        self.cacheDir = cacheDir
+        self.maxSizeBytes = None if maxSizeMb is None else maxSizeMb * 1024 * 1024
+        os.makedirs(self.cacheDir, exist_ok=True)
+
+    def _entry_path(self, folder):
+        key = hashlib.sha1(os.path.abspath(folder).encode('utf-8')).hexdigest()
+        return os.path.join(self.cacheDir, f'{key}.pickle')
+
+    # Every entry is a small header pickle, with the version and fingerprint, followed by the pickled stats. The header can be
+    # checked without loading the stats, which hold every message of the conversation.
+    # Returns the open entry file positioned at the stats along with its header, or (None, None) if there's no usable entry
+    def _open_entry(self, folder):
+        path = self._entry_path(folder)
+        if not os.path.exists(path):
+            return None, None
+        f = open(path, 'rb')
+        try:
+            header = pickle.load(f)
+        except Exception as e:
+            # A corrupt or incompatible entry is treated the same as a missing one
+            print(f'Ignoring unreadable cache entry {path}: {e}')
+            f.close()
+            return None, None
+        if not isinstance(header, dict) or header.get('version') != CACHE_VERSION:
+            f.close()
+            return None, None
+        return f, header
+
+    def _load_stats(self, folder, f):
+        try:
+            return True, pickle.load(f)
+        except Exception as e:
+            print(f'Ignoring unreadable cache entry {self._entry_path(folder)}: {e}')
+            return False, None
+
+    # filesFingerprint may be any picklable value which identifies the analysed files and the options they were analysed with.
+    # Returns a (hit, convoStats) pair. convoStats may be None on a hit, since conversations which were too small to analyse are cached too
+    def get(self, folder, filesFingerprint):
+        f, header = self._open_entry(folder)
+        if f is None:
+            return False, None
+        with f:
+            if header['fingerprint'] != filesFingerprint:
+                return False, None
+            hit, convoStats = self._load_stats(folder, f)
+        if hit:
+            # Mark the entry as recently used, so that it is evicted last
+            os.utime(self._entry_path(folder))
+        return hit, convoStats
+
+    # Returns the last analysis of the folder even if its message files have changed since, or None if there is none
+    def get_previous(self, folder):
+        f, _ = self._open_entry(folder)
+        if f is None:
+            return None
+        with f:
+            return self._load_stats(folder, f)[1]
+
+    def put(self, folder, filesFingerprint, convoStats):
+        path = self._entry_path(folder)
+        # Every write gets its own temporary file, so that sessions saving the same entry at once don't write into each other's
+        fd, tmpPath = tempfile.mkstemp(dir=self.cacheDir, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                pickle.dump({'version': CACHE_VERSION, 'fingerprint': filesFingerprint}, f, protocol=pickle.HIGHEST_PROTOCOL)
+                pickle.dump(convoStats, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmpPath, path)
+        except BaseException:
+            os.remove(tmpPath)
+            raise
+
+    def _entry_paths(self):
+        return [os.path.join(self.cacheDir, x) for x in os.listdir(self.cacheDir) if x.endswith('.pickle')]
+
+    # Removes the least recently used entries until the cache fits into maxSizeBytes
+    def enforce_size_limit(self):
+        if self.maxSizeBytes is None:
+            return
+        entries = sorted(((os.path.getmtime(x), os.path.getsize(x), x) for x in self._entry_paths()), reverse=True)
+        totalSize = 0
+        for _, size, path in entries:
+            totalSize += size
+            if totalSize > self.maxSizeBytes:
+                os.remove(path)
+
+    # Removes only the files the cache created, along with temporary files left by interrupted writes, since the cache directory
+    # may be shared with other files
+    def clear(self):
+        tmpPaths = [os.path.join(self.cacheDir, x) for x in os.listdir(self.cacheDir) if x.endswith('.tmp')]
+        for path in self._entry_paths() + tmpPaths:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
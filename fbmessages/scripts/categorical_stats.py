@@ -1,45 +1,42 @@
 import numpy as np
 import datetime
-from dateutil import rrule
-from datetime import timedelta
-from collections import defaultdict
 from math import pi
 
 from bokeh.layouts import column, row
 from bokeh.plotting import figure
-from bokeh.models import ColumnDataSource, HoverTool, Select, Panel
+from bokeh.models import ColumnDataSource, FactorRange, HoverTool, Select, Panel
 from bokeh.palettes import Category10_7, Category20_20, Turbo256
 
 from scripts.plot_style import style
 
 
-def categorical_stats_tab(convoStats, convoSelection):
-    conversationTitles = sorted([x.title for x in convoStats])
-
-    def make_monthly_dataset(convoTitle):
-        convo = next((x for x in convoStats if x.title == convoTitle))
-
-        startDate = convo.messages[0].datetime - timedelta(days=convo.messages[0].datetime.day - 1);
-        endDate = convo.messages[-1].datetime;
-        
-        xdata_monthly = []
-        for dt in rrule.rrule(rrule.MONTHLY, dtstart=startDate, until=endDate):
-            xdata_monthly.append(dt.strftime('%Y-%m'))
-        
-        for month in xdata_monthly:
-            if month not in convo.monthlyCountsBySender:
-                convo.monthlyCountsBySender[month] = defaultdict(int) # need zeros for all participants if no messages were sent that month
-        
-        ydata_monthly = {participant: [convo.monthlyCountsBySender[month][participant] for month in xdata_monthly] for participant in convo.participants}
-
-        color = Category10_7 if len(convo.participants) < 7 else Category20_20 if len(convo.participants) < 20 else Turbo256
-        colors = [color[i] for i in range(len(convo.participants))]
-        
-        # I need separate datasets here because column lenghts differ
-        return {'x_value': xdata_monthly, **ydata_monthly}, {'participants': list(convo.participants), 'colors': colors}
-
-    def make_day_name_dataset(convoTitle):
-        convo = next((x for x in convoStats if x.title == convoTitle))
+def categorical_stats_tab(convoRegistry, convoSelection):
+
+    # One bar segment for every month and participant who sent messages in it, stacked with the bottom and top columns. Unlike
+    # vbar_stack, which needs a renderer per participant, a single glyph can show conversations with any participants
+    def make_monthly_dataset(convoId):
+        convo = convoRegistry[convoId]
+        participants = convo.participantOrder
+        months = np.datetime_as_string(convo.monthlyMonths, unit='M')
+
+        palette = Category10_7 if len(participants) < 7 else Category20_20 if len(participants) < 20 else Turbo256
+        colors = np.array([palette[i % len(palette)] for i in range(len(participants))], dtype=object)
+
+        counts = convo.monthlyCounts
+        tops = np.cumsum(counts, axis=1)
+        monthIds, senderIds = np.nonzero(counts)
+
+        src = ColumnDataSource(data={'x_value': months[monthIds].tolist(),
+                                     'bottom': (tops - counts)[monthIds, senderIds],
+                                     'top': tops[monthIds, senderIds],
+                                     'count': counts[monthIds, senderIds],
+                                     'sender': np.array(participants, dtype=object)[senderIds].tolist(),
+                                     'color': colors[senderIds].tolist()})
+        # Months without messages have no bars, but still get a place on the axis
+        return src, months.tolist()
+
+    def make_day_name_dataset(convoId):
+        convo = convoRegistry[convoId]
         num_days = max(
             (convo.messages[-1].datetime - convo.messages[0].datetime).days, 1)
         xdataDayName = ['Monday', 'Tuesday', 'Wednesday',
@@ -49,8 +46,8 @@ def categorical_stats_tab(convoStats, convoSelection):
 
         return ColumnDataSource(data={'top': ydataDayName, 'x_value': xdataDayName})
 
-    def make_hourly_dataset(convoTitle):
-        convo = next((x for x in convoStats if x.title == convoTitle))
+    def make_hourly_dataset(convoId):
+        convo = convoRegistry[convoId]
         num_days = max(
             (convo.messages[-1].datetime - convo.messages[0].datetime).days, 1)
 
@@ -76,19 +73,19 @@ def categorical_stats_tab(convoStats, convoSelection):
 
         return p
 
-    def make_monthly_plot(src, stackedSrc):
-        p = figure(x_range=src['x_value'], plot_height=550, plot_width=550, toolbar_location=None,
-                   title='Monthly message counts', x_axis_label='Date', y_axis_label='Message count', tools='hover', tooltips='@x_value: $name sent @$name messages')
+    def make_monthly_plot(src, months, participantCount):
+        p = figure(x_range=FactorRange(factors=months), plot_height=550, plot_width=550, toolbar_location=None,
+                   title='Monthly message counts', x_axis_label='Date', y_axis_label='Message count', tools='hover', tooltips='@x_value: @sender sent @count messages')
 
-        p.vbar_stack(stackedSrc['participants'], x='x_value', width=0.9, color=stackedSrc['colors'], source=src,
-                    fill_alpha=0.7, legend_label=stackedSrc['participants'], hover_fill_alpha=1.0)
+        p.vbar(x='x_value', bottom='bottom', top='top', width=0.9, color='color', source=src,
+               fill_alpha=0.7, legend_field='sender', hover_fill_alpha=1.0)
 
         p.y_range.start = 0
         p.xaxis.major_label_orientation = pi/2
         p.grid.grid_line_alpha = 0
         p.outline_line_alpha = 0
         p.legend.location = "top_left"
-        p.legend.visible = True if len(stackedSrc['participants']) < 5 else False        
+        p.legend.visible = participantCount < 5
         p.legend.orientation = "horizontal"
 
         return p
@@ -101,28 +98,31 @@ def categorical_stats_tab(convoStats, convoSelection):
         return _make_histogram(src, 'Average messages per hour of the day', 'Hour', 'Average message count',
                                [('Average message count', '@top'), ('Hour', '@x_value')])
 
-    def on_conversation_changed(attr, oldValue, newValue):
-        newMonthlySrc, newMonthlyStackedSrc = make_monthly_dataset(newValue)
-        newDayNameSrc = make_day_name_dataset(newValue)
-        newHourlySrc = make_hourly_dataset(newValue)
-        # I have to redraw the whole plot, since I need to pass the x range to figure for categorical data
-        plotRow.children = [make_monthly_plot(newMonthlySrc, newMonthlyStackedSrc),
-                            make_day_name_plot(newDayNameSrc),
-                            make_hourly_plot(newHourlySrc)]
+    # Called when the selected conversation changes while this tab is visible, or when this tab is switched to after it changed.
+    # The figures are kept, only the data and factors they show are replaced
+    def refresh():
+        convo = convoRegistry[convoSelection.value]
+        newMonthlySrc, months = make_monthly_dataset(convoSelection.value)
+        monthlySrc.data.update(newMonthlySrc.data)
+        monthlyPlot.x_range.factors = months
+        monthlyPlot.legend.visible = len(convo.participantOrder) < 5
 
-    convoSelection.on_change('value', on_conversation_changed)
+        # The weekdays and hours are the same for every conversation, so only the heights of the bars change
+        for src, newSrc in [(dayNameSrc, make_day_name_dataset(convoSelection.value)),
+                            (hourlySrc, make_hourly_dataset(convoSelection.value))]:
+            src.patch({'top': [(slice(len(newSrc.data['top'])), newSrc.data['top'])]})
 
-    monthlySrc, monthlyStackedSrc = make_monthly_dataset(conversationTitles[0])
-    monthlyPlot = make_monthly_plot(monthlySrc, monthlyStackedSrc)
+    monthlySrc, months = make_monthly_dataset(convoSelection.value)
+    monthlyPlot = make_monthly_plot(monthlySrc, months, len(convoRegistry[convoSelection.value].participantOrder))
 
-    dayNameSrc = make_day_name_dataset(conversationTitles[0])
+    dayNameSrc = make_day_name_dataset(convoSelection.value)
     dayNamePlot = make_day_name_plot(dayNameSrc)
 
-    hourlySrc = make_hourly_dataset(conversationTitles[0])
+    hourlySrc = make_hourly_dataset(convoSelection.value)
     hourlyPlot = make_hourly_plot(hourlySrc)
 
     plotRow = row(monthlyPlot, dayNamePlot, hourlyPlot)
     layout = column(row(convoSelection), plotRow)
     tab = Panel(child=layout, title='Categorical statistics')
 
-    return tab
+    return tab, refresh
@@ -1,221 +1,195 @@
 # bokeh basics
-import pandas as pd
 import numpy as np
 import datetime
 from math import pi
-from itertools import chain
 
 from datetime import date
 from collections import defaultdict
 from bokeh.layouts import column, row
 from bokeh.plotting import figure
-from bokeh.models import ColumnDataSource, HoverTool, Select, Panel, DateRangeSlider, Div, Title
+from bokeh.models import ColumnDataSource, HoverTool, Select, Panel, DateRangeSlider, Div, Title, TextInput
 from bokeh.transform import cumsum
+from bokeh.events import RangesUpdate, Reset
 
 from bokeh.palettes import Category10_7, Turbo256
 
 from scripts.plot_style import style
 from scripts.analyser import ConvoStats
+from scripts.downsampling import downsample_counts, full_range_ms, ms_to_day, RESOLUTION_NAMES
+from scripts.message_viewer import MessageViewer
+from scripts.search_index import search_messages
+from scripts.segmentation import SessionSummary
+
+
+TIMESERIES_PLOT_WIDTH = 600
+
+
+# Everything the daily statistics tab displays for one conversation and date range
+class RangeSummary:
+    def __init__(self, convo):
+        self.convo = convo
+        self.messages = convo.messages
+        self.days = slice(None)  # rows of the daily counts of the conversation which are in the range
+        self.messageRange = (0, len(convo.messages))  # positions of the messages in the range in the conversation's message store
+        self.messageCountsBySender = defaultdict(int)
+        self.wordCountsBySender = defaultdict(int)
+        self.initiationsBySender = defaultdict(int)
+        self.totalWordCount = 0
+        self.sentimentSum = 0.0  # sum of the sentiments of the messages in the range
+        # The same counts as arrays indexed by the sender ids of the message store
+        self.messageCountsBySenderId = np.zeros(0, dtype=np.int64)
+        self.wordCountsBySenderId = np.zeros(0, dtype=np.int64)
+        self.initiationsBySenderId = np.zeros(0, dtype=np.int64)
+        # Conversation statistics, like durations and pauses between conversations
+        self.sessions = SessionSummary()
+
+
+# Computes the statistics of all the daily tab displays for a date range at once, so that every widget is fed from one result.
+# Totals come from the prefix sums of the conversation and conversations from its session index, so nothing goes through the
+# messages of the range
+def summarise_range(convo, startDate=None, endDate=None):
+    rez = RangeSummary(convo)
+    messages = convo.messages.between(startDate, endDate)
+    rez.messages = messages
+
+    if startDate is not None and endDate is not None:
+        rez.messageRange = (convo.messages.offset_of(startDate), convo.messages.offset_of(endDate + datetime.timedelta(days=1)))
+        rez.days = slice(np.searchsorted(convo.dailyDates, np.datetime64(startDate, 'D'), side='left'),
+                         np.searchsorted(convo.dailyDates, np.datetime64(endDate, 'D'), side='right'))
+
+    totals = convo.rangeTotals.between(startDate, endDate)
+    rez.messageCountsBySenderId = totals.messageCountsBySenderId
+    rez.wordCountsBySenderId = totals.wordCountsBySenderId
+    rez.initiationsBySenderId = totals.initiationsBySenderId
+    rez.sentimentSum = totals.sentimentSum
+
+    rez.sessions = convo.sessions.summarise(convo.messages, *rez.messageRange)
+
+    for senderId, sender in enumerate(messages.senders):
+        if rez.messageCountsBySenderId[senderId] > 0:
+            rez.messageCountsBySender[sender] = int(rez.messageCountsBySenderId[senderId])
+            rez.wordCountsBySender[sender] = int(rez.wordCountsBySenderId[senderId])
+        if rez.initiationsBySenderId[senderId] > 0:
+            rez.initiationsBySender[sender] = int(rez.initiationsBySenderId[senderId])
+    rez.totalWordCount = int(rez.wordCountsBySenderId.sum())
+
+    return rez
+
+
+def daily_stats_tab(convoRegistry, convoSelection):
+
+    # By-party and total message counts per day, week or month, depending on how long visibleRange is. visibleRange is the
+    # (start, end) pair of days shown by the plot, or None to show the whole range of the summary
+    def make_timeseries_datasets(summary, visibleRange=None):
+        participants = summary.convo.participantOrder
+        dates, counts, resolution = downsample_counts(summary.convo.dailyDates[summary.days],
+                                                      summary.convo.dailyCounts[summary.days], visibleRange, TIMESERIES_PLOT_WIDTH)
+        totals = counts.sum(axis=1)
 
-
-def daily_stats_tab(convoStats, convoSelection):
-
-    # Daily by-party and total message counts
-    def make_timeseries_datasets(convoTitle, startDate=None, endDate=None):
-        convo: analyser.ConvoStats = next(
-            (x for x in convoStats if x.title == convoTitle))
-        participants = convo.participants
-        participantToId = {x: i for i, x in enumerate(participants)}
-        totalsId = len(participants)
-        participantToId['Total'] = totalsId
-
-        xs = [[] for _ in participants] + [[]]
-        ys = [[] for _ in participants] + [[]]
         color = Category10_7 if len(participants) < 7 else Turbo256
         colors = [color[i] for i in range(len(participants)+1)]
-        labels = sorted(participants) + ['Total']
-
-        for date in convo.dailyCountsBySender.keys():
-            convertedDate = pd.to_datetime(date)
-            if startDate is not None and endDate is not None and (convertedDate < startDate or convertedDate > endDate):
-                continue
-
-            for i, (sender, count) in enumerate(convo.dailyCountsBySender[date].items()):
-                participantId = participantToId[sender]
+        labels = participants + ['Total']
 
-                xs[participantId].append(convertedDate)
-                ys[participantId].append(count)
-
-            xs[totalsId].append(convertedDate)
-            ys[totalsId].append(sum(convo.dailyCountsBySender[date].values()))
+        # The line of a participant only goes through the days on which they sent messages. Nonzero counts are picked
+        # participant by participant, so that the lines are consecutive runs of the flattened arrays
+        participantIds, dayIds = np.nonzero(counts.T)
+        lineEnds = np.cumsum(np.bincount(participantIds, minlength=len(participants)))[:-1]
+        xs = np.split(dates[dayIds], lineEnds) + [dates]
+        ys = np.split(counts[dayIds, participantIds], lineEnds) + [totals]
 
         # I need an invisible scatterplot for nice tooltips, because multiline tooltips don't work well
-        totalX = list(chain.from_iterable(xs))
-        totalY = list(chain.from_iterable(ys))
-        totalLabels = list(chain.from_iterable(
-            [[x]*len(xs[participantToId[x]]) for x in labels]))
+        totalX = np.concatenate([dates[dayIds], dates])
+        totalY = np.concatenate([counts[dayIds, participantIds], totals])
+        totalLabels = np.array(labels)[np.append(participantIds, np.full(len(dates), len(participants)))].tolist()
 
         return (ColumnDataSource(data={'x': xs, 'y': ys, 'color': colors, 'label': labels}),
-                ColumnDataSource(data={'x': totalX, 'y': totalY, 'label': totalLabels}))
-
-    def make_piechart_dataset(convoTitle, startDate=None, endDate=None):
-        convo: analyser.ConvoStats = next(
-            (x for x in convoStats if x.title == convoTitle))
-
-        df = pd.DataFrame(columns=[
-            'sender', 'messageCount', 'messageCountAngle', 'f_messageCount',
-            'wordCount', 'wordCountAngle', 'f_wordCount', 'initiationCount', 'initiationCountAngle', 'f_initiationCount', 'color'])
+                ColumnDataSource(data={'x': totalX, 'y': totalY, 'label': totalLabels}),
+                f'{RESOLUTION_NAMES[resolution]} message counts by date')
+
+    # Number of matching messages on the days (or weeks, months) of the search hits, at the same resolution as the timeseries
+    def make_search_hits_dataset(summary, hits, visibleRange=None):
+        dailyDates = summary.convo.dailyDates[summary.days]
+        if hits is None or len(hits) == 0 or len(dailyDates) == 0:
+            return ColumnDataSource(data={'x': [], 'y': []})
+
+        if visibleRange is None:
+            visibleRange = (dailyDates[0], dailyDates[-1])
+        hitDays, hitCounts = np.unique(summary.convo.messages.days[hits], return_counts=True)
+        # Days are stored as proleptic Gregorian ordinals
+        hitDates = (hitDays.astype(np.int64) - date(1970, 1, 1).toordinal()).astype('datetime64[D]')
+        dates, counts, _ = downsample_counts(hitDates, hitCounts[:, None], visibleRange, TIMESERIES_PLOT_WIDTH)
+        return ColumnDataSource(data={'x': dates, 'y': counts[:, 0]})
+
+    def make_piechart_dataset(summary):
+        convo = summary.convo
+        messageCount = len(summary.messages)
         color = Category10_7 if len(convo.participants) <= 7 else Turbo256
 
-        allMessages = convo.messages
-        if startDate is not None and endDate is not None:
-            allMessages = list(filter(lambda m: m.datetime.date() >=
-                                      startDate and m.datetime.date() <= endDate, allMessages))
-        totalWordCount = sum(len(x.content.split()) for x in allMessages)
-        participantCount = len(convo.participants)
-
-        initiationsBySender = defaultdict(int)
-        curConvoParticipants = set()
-        lastMessage = ''
-        for i, message in enumerate(allMessages):
-            if i == 0:
-                # first message, so conversation initiated
-                initiationsBySender[message.sender] += 1
-            else:
-                timeDiff = message.datetime - allMessages[i-1].datetime
-                # It is assumed that if 4h passed since last message, a new conversation has been initiated
-                hoursPassed = timeDiff.total_seconds() // (60*60)
-                # Extra conditions: if the last convo only had one participant or the last message was a question, don't count a new initiation
-                # TODO: Perhaps I should apply the same checks when calculating conversation stats, though for durations between messages etc just the time check is probably better
-                if hoursPassed >= 4 and '?' not in lastMessage and len(curConvoParticipants) > 1:
-                    initiationsBySender[message.sender] += 1
-                    curConvoParticipants = set()
-            lastMessage = message.content
-            curConvoParticipants |= {message.sender}
-        totalInitiationCount = sum(initiationsBySender.values())
-
-        for i, participant in enumerate(sorted(convo.participants)):
-            messages = list(filter(lambda m: m.sender ==
-                                   participant, allMessages))
-
-            tdf = pd.DataFrame()
-            tdf['sender'] = [participant]
-            tdf['messageCount'] = [len(messages)]
-            # The +1/+2 is to avoid division by zero if no messages are present in the interval
+        senders = sorted(convo.participants)
+        participantCount = len(senders)
+        # Participants who only sent messages without content are not in the message store. Their id is -1,
+        # which picks the zero appended to the per sender arrays
+        senderIds = np.array([summary.messages.sender_id(x) for x in senders], dtype=np.int64)
+        messageCounts = np.append(summary.messageCountsBySenderId, 0)[senderIds]
+        wordCounts = np.append(summary.wordCountsBySenderId, 0)[senderIds]
+        initiationCounts = np.append(summary.initiationsBySenderId, 0)[senderIds]
+        totalWordCount = summary.totalWordCount
+        totalInitiationCount = initiationCounts.sum()
+
+        # An empty range gives nan percentages instead of failing
+        with np.errstate(divide='ignore', invalid='ignore'):
+            # The +1/+participantCount is to avoid division by zero if no messages are present in the interval
             # TODO: Investigate whether I need to care about div by 0 here and in other places
-            tdf['messageCountAngle'] = [
-                (len(messages) + 1)/(len(allMessages) + participantCount) * 2*pi]
-            tdf['f_messageCount'] = [
-                f'{len(messages)} messages ({len(messages)/len(allMessages)*100:.2f}%)']
-            tdf['wordCount'] = [sum(len(x.content.split()) for x in messages)]
-            tdf['wordCountAngle'] = [
-                (tdf['wordCount'][0] + 1) / (totalWordCount + participantCount) * 2*pi]
-            tdf['f_wordCount'] = [
-                f'{tdf["wordCount"][0]} words ({tdf["wordCount"][0]/totalWordCount*100:.2f}%)']
-            tdf['initiationCount'] = [initiationsBySender[participant]]
-            tdf['initiationCountAngle'] = [
-                initiationsBySender[participant] / totalInitiationCount * 2*pi]
-            tdf['f_initiationCount'] = f'{tdf["initiationCount"][0]} initations ({tdf["initiationCount"][0]/totalInitiationCount*100:.2f}%)'
-            tdf['color'] = color[i]
-            df = df.append(tdf)
-
-        return ColumnDataSource(df)
-
-    def make_messages_display(convoTitle, startDate=None, endDate=None):
-        convo: analyser.ConvoStats = next(
-            (x for x in convoStats if x.title == convoTitle))
-
-        allMessages = convo.messages
-        if startDate is not None and endDate is not None:
-            allMessages = list(filter(lambda m: m.datetime.date() >=
-                                      startDate and m.datetime.date() <= endDate, allMessages))
-
-        # TODO: A single long word will make the div ignore width settings and overflow the window
-        rez = '<p style="overflow-wrap:break-word;width:95%;">'
-        for i, message in enumerate(allMessages):
-            if i > 500:
-                break
-            rez += f'<b>{message.sender}</b> <i>({message.datetime.strftime("%Y/%m/%d %H:%M")})</i>: {message.content} </br>'
-        rez += '</p>'
-        return Div(text=rez, sizing_mode='stretch_width')
+            messageCountAngles = (messageCounts + 1) / (messageCount + participantCount) * 2*pi
+            wordCountAngles = (wordCounts + 1) / (totalWordCount + participantCount) * 2*pi
+            initiationCountAngles = initiationCounts / totalInitiationCount * 2*pi
+            messagePercentages = messageCounts / messageCount * 100
+            wordPercentages = wordCounts / totalWordCount * 100
+            initiationPercentages = initiationCounts / totalInitiationCount * 100
+
+        return ColumnDataSource(data={
+            'sender': senders,
+            'messageCount': messageCounts,
+            'messageCountAngle': messageCountAngles,
+            'f_messageCount': [f'{x} messages ({y:.2f}%)' for x, y in zip(messageCounts, messagePercentages)],
+            'wordCount': wordCounts,
+            'wordCountAngle': wordCountAngles,
+            'f_wordCount': [f'{x} words ({y:.2f}%)' for x, y in zip(wordCounts, wordPercentages)],
+            'initiationCount': initiationCounts,
+            'initiationCountAngle': initiationCountAngles,
+            'f_initiationCount': [f'{x} initations ({y:.2f}%)' for x, y in zip(initiationCounts, initiationPercentages)],
+            'color': [color[i] for i in range(participantCount)]})
 
     # Statistics for the conversations in the selected date range like average message length
-    def make_stats_text(convoTitle, startDate=None, endDate=None):
-        convo: analyser.ConvoStats = next(
-            (x for x in convoStats if x.title == convoTitle))
-
-        allMessages = convo.messages
-        if startDate is not None and endDate is not None:
-            allMessages = list(filter(lambda m: m.datetime.date() >=
-                                      startDate and m.datetime.date() <= endDate, allMessages))
-
-        totalMessageLensWords = defaultdict(int)
-        messageCountsByParticipant = defaultdict(int)
-        convoDurationSum = 0
-        convoLenWordsSum = 0
-        pauseBetweenConvosDurationSum = 0
-        pauseBetweenMessagesInConvoSum = 0
-
-        lastConvoStart = allMessages[0].datetime
-        convoWordCount = len(allMessages[0].content.split())
-        convoCount = 0
-        convoMessageCount = 1
-        convoPauseBetweenMessagesSum = 0
-        
-        for i, message in enumerate(allMessages):
-            wordCount = len(message.content.split())
-            totalMessageLensWords[message.sender] += wordCount
-            messageCountsByParticipant[message.sender] += 1
-            totalMessageLensWords['total'] += wordCount
-
-            if i != 0:
-                timeDiff = message.datetime - allMessages[i-1].datetime
-                hoursPassed = timeDiff.total_seconds() // (60*60)
-                if hoursPassed >= 4:
-                    # A new conversation has begun
-                    convoDuration = (
-                        allMessages[i-1].datetime - lastConvoStart).total_seconds()
-                    convoDurationSum += convoDuration
-                    convoCount += 1
-                    convoLenWordsSum += convoWordCount
-                    pauseDuration = timeDiff.total_seconds()
-                    pauseBetweenConvosDurationSum += pauseDuration
-                    pauseBetweenMessagesInConvoSum += convoPauseBetweenMessagesSum / convoMessageCount
-                    convoMessageCount = 1
-                    convoPauseBetweenMessagesSum = 0
-                
-                    convoWordCount = wordCount
-                    lastConvoStart = message.datetime
-                else:
-                    convoWordCount += wordCount
-                    convoPauseBetweenMessagesSum += timeDiff.total_seconds()
-                    convoMessageCount += 1
-                    
+    def make_stats_text(summary):
+        messageCount = len(summary.messages)
+        convoCount = summary.sessions.convoCount
         # In some edge cases there may be no messages sent to the participant
         if convoCount == 0:
             return ''
         
-        hours, minutes = divmod(convoDurationSum/convoCount, 60*60)
+        hours, minutes = divmod(summary.sessions.convoDurationSum/convoCount, 60*60)
         rez = '<p style="width:95%;">'
         rez += f'Average conversation duration: {hours:.0f} h {minutes // 60:.0f} min</br>'
         if convoCount > 2:
             hours, minutes = divmod(
-                pauseBetweenConvosDurationSum/(convoCount-1), 60*60)
+                summary.sessions.pauseBetweenConvosDurationSum/(convoCount-1), 60*60)
             rez += f'Average pause between conversations duration: {hours:.0f} h {minutes // 60:.0f} min</br>'
-        rez += f'Average conversation length: {len(allMessages) / convoCount:.1f} messages, {convoLenWordsSum // convoCount} words</br>'
-        minutes, seconds = divmod(convoPauseBetweenMessagesSum/convoCount, 60)
+        rez += f'Average conversation length: {messageCount / convoCount:.1f} messages, {summary.sessions.convoLenWordsSum // convoCount} words</br>'
+        minutes, seconds = divmod(summary.sessions.lastConvoPauseBetweenMessagesSum/convoCount, 60)
         rez += f'Average time between messages in a conversation: {minutes:.1f} min {seconds:.1f} s</br>'
-        rez += f'Average message length: {totalMessageLensWords["total"] // len(allMessages)} words</br>'
-        for participant in convo.participants:
-            if messageCountsByParticipant[participant] == 0:
+        rez += f'Average message length: {summary.totalWordCount // messageCount} words</br>'
+        rez += f'Average message sentiment: {summary.sentimentSum / messageCount:.2f}</br>'
+        for participant in summary.convo.participants:
+            if summary.messageCountsBySender[participant] == 0:
                 continue
-            rez += f'Average length of messages from {participant}: {totalMessageLensWords[participant] // messageCountsByParticipant[participant]} words</br>'
+            rez += f'Average length of messages from {participant}: {summary.wordCountsBySender[participant] // summary.messageCountsBySender[participant]} words</br>'
         rez += '</p>'
 
         return rez
 
-    def make_timeseries_plot(src, tooltipSrc):
-        p = figure(plot_width=600, plot_height=600, title='Daily message counts by date',
+    def make_timeseries_plot(src, tooltipSrc, title):
+        p = figure(plot_width=TIMESERIES_PLOT_WIDTH, plot_height=600, title=title,
                    x_axis_type='datetime', x_axis_label='Date', y_axis_label='Message count')
 
         p.multi_line(xs='x', ys='y', source=src, color='color',
@@ -229,6 +203,8 @@ def daily_stats_tab(convoStats, convoSelection):
         hover.renderers = [tooltipScatter]
         p.add_tools(hover)
 
+        p.scatter('x', 'y', source=searchHitSrc, marker='inverted_triangle', size=10, color='red', legend_label='Search hits')
+
         return p
 
     def _make_piechart(src, startAngle, endAngle, title, bottomTitle, tooltips):
@@ -280,85 +256,117 @@ def daily_stats_tab(convoStats, convoSelection):
                 totalInitiations = sum(pieSrc.data["initiationCount"])
                 pie.below[1].text = f'Total conversations: {totalInitiations}'
 
-    def on_conversation_changed(attr, oldValue, newValue):
-        convo: analyser.ConvoStats = next(
-            (x for x in convoStats if x.title == newValue))
-
-        # When switching to a new convo, update the date range slider to match convo data ranges
-        initialDates = list(convo.dailyCountsBySender.keys())
-        start = pd.to_datetime(initialDates[0]).date()
-        end = pd.to_datetime(initialDates[-1]).date()
-        dateSlider.start = start
-        dateSlider.end = end
-        dateSlider.value = (start, end)
-
+    def _update_timeseries(summary, visibleRange=None):
         # TODO: There is some black magic going on here, find if there is a proper way to do this
-        newScr, newTooltipSrc = make_timeseries_datasets(newValue)
+        newScr, newTooltipSrc, title = make_timeseries_datasets(summary, visibleRange)
         src.data.update(newScr.data)
         tooltipSrc.data.update(newTooltipSrc.data)
-        newPieSrc = make_piechart_dataset(newValue)
+        p.title.text = title
+        newSearchHitSrc = make_search_hits_dataset(summary, shownSummary['hits'], visibleRange)
+        searchHitSrc.data.update(newSearchHitSrc.data)
+
+    # Shows the messages of the range which match the search query, or all of them if there is none
+    def _update_search(summary):
+        query = searchInput.value.strip()
+        if not query:
+            shownSummary['hits'] = None
+            messageViewer.show(summary.messages)
+            return
+
+        hits = search_messages(summary.convo, query)
+        start, end = summary.messageRange
+        shownSummary['hits'] = hits[(hits >= start) & (hits < end)]
+        messageViewer.show(summary.convo.messages, shownSummary['hits'])
+
+    # Shows the whole range of the summary. The plot would otherwise keep the zoom of the previously shown range, and its
+    # own reset would only go back to the part of the range which was sent for that zoom
+    def _reset_timeseries_range(summary):
+        shownSummary['visibleRange'] = None
+        _update_timeseries(summary)
+        dates = summary.convo.dailyDates[summary.days]
+        if len(dates) > 0:
+            p.x_range.start, p.x_range.end = full_range_ms(dates)
+
+    def _update_displays(summary):
+        shownSummary['summary'] = summary
+        _update_search(summary)
+        _reset_timeseries_range(summary)
+        newPieSrc = make_piechart_dataset(summary)
         pieSrc.data.update(newPieSrc.data)
 
         _update_pie_bottom_labels()
 
-        messageColumn.children = [make_messages_display(newValue)]
+        statsDisplay.text = make_stats_text(summary)
+
+    # Called when the selected conversation changes while this tab is visible, or when this tab is switched to after it changed
+    def refresh():
+        convo = convoRegistry[convoSelection.value]
+
+        # When switching to a new convo, update the date range slider to match convo data ranges
+        start = convo.dailyDates[0].item()
+        end = convo.dailyDates[-1].item()
+        dateSlider.start = start
+        dateSlider.end = end
+        dateSlider.value = (start, end)
 
-        statsDisplay.text = make_stats_text(newValue)
+        _update_displays(summarise_range(convo))
 
     def on_date_range_changed(attr, old, new):
-        convoToPlot = convoSelection.value
+        convo = convoRegistry[convoSelection.value]
         startDate, endDate = dateSlider.value_as_date
 
-        # TODO: There is some black magic going on here, find if there is a proper way to do this
-        new_src, newTooltipSrc = make_timeseries_datasets(
-            convoToPlot, startDate, endDate)
-        src.data.update(new_src.data)
-        tooltipSrc.data.update(newTooltipSrc.data)
-        newPieSrc = make_piechart_dataset(convoToPlot, startDate, endDate)
-        pieSrc.data.update(newPieSrc.data)
-
-        _update_pie_bottom_labels()
+        _update_displays(summarise_range(convo, startDate, endDate))
 
-        messageColumn.children = [make_messages_display(
-            convoToPlot, startDate, endDate)]
+    # Zooming or panning the timeseries only sends the newly visible part of the range, at a resolution which fits the plot
+    def on_timeseries_ranges_update(event):
+        shownSummary['visibleRange'] = (ms_to_day(event.x0), ms_to_day(event.x1))
+        _update_timeseries(shownSummary['summary'], shownSummary['visibleRange'])
 
-        statsDisplay.text = make_stats_text(convoToPlot, startDate, endDate)
+    def on_timeseries_reset(event):
+        _reset_timeseries_range(shownSummary['summary'])
 
-    # A dropdown list to select a conversation
-    conversationTitles = sorted([x.title for x in convoStats])
-    convoSelection.on_change('value', on_conversation_changed)
+    def on_search_changed(attr, old, new):
+        _update_search(shownSummary['summary'])
+        _update_timeseries(shownSummary['summary'], shownSummary['visibleRange'])
 
     # A slider to select a date range for the analysis
-    initialConvo: analyser.ConvoStats = next(
-        (x for x in convoStats if x.title == conversationTitles[0]))
-    initialDates = list(initialConvo.dailyCountsBySender.keys())
-    start = pd.to_datetime(initialDates[0]).date()
-    end = pd.to_datetime(initialDates[-1]).date()
+    initialConvo = convoRegistry[convoSelection.value]
+    start = initialConvo.dailyDates[0].item()
+    end = initialConvo.dailyDates[-1].item()
     dateSlider = DateRangeSlider(
         title='Date interval', start=start, end=date.today(), value=(start, end), step=24*60*60*1000)
     dateSlider.on_change('value_throttled', on_date_range_changed)
 
-    src, tooltipSrc = make_timeseries_datasets(
-        conversationTitles[0], start, end)
-    p = make_timeseries_plot(src, tooltipSrc)
+    initialSummary = summarise_range(initialConvo, start, end)
+    # The summary of the range selected with the slider, the part of it visible in the timeseries and the positions of the
+    # messages in it which match the search, or None if nothing is searched for
+    shownSummary = {'summary': initialSummary, 'visibleRange': None, 'hits': None}
+
+    searchInput = TextInput(title='Search messages', placeholder='Words which all have to be in a message')
+    searchInput.on_change('value', on_search_changed)
+    searchHitSrc = make_search_hits_dataset(initialSummary, None)
+
+    src, tooltipSrc, title = make_timeseries_datasets(initialSummary)
+    p = make_timeseries_plot(src, tooltipSrc, title)
     p = style(p)
+    p.on_event(RangesUpdate, on_timeseries_ranges_update)
+    p.on_event(Reset, on_timeseries_reset)
 
-    pieSrc = make_piechart_dataset(conversationTitles[0], start, end)
+    pieSrc = make_piechart_dataset(initialSummary)
     piePlots = make_piechart_plots(pieSrc)
 
-    messageContents = [make_messages_display(
-        conversationTitles[0], start, end)]
+    messageViewer = MessageViewer(initialSummary.messages)
 
-    messageColumn = column(children=messageContents,
-                           height=670, css_classes=['scrollable'], sizing_mode='stretch_width')
+    messageColumn = column(children=[messageViewer.pageDisplay],
+                           height=570, css_classes=['scrollable'], sizing_mode='stretch_width')
 
-    statsDisplay = Div(text=make_stats_text(conversationTitles[0], start, end))
+    statsDisplay = Div(text=make_stats_text(initialSummary))
     statsColumn = column(children=[statsDisplay],
                          height=540, css_classes=['scrollable'])
 
     # create layout
     leftColumn = column(convoSelection, dateSlider, statsColumn)
-    layout = row(leftColumn, p, piePlots, messageColumn)
+    layout = row(leftColumn, p, piePlots, column(searchInput, messageViewer.controls, messageColumn, sizing_mode='stretch_width'))
     tab = Panel(child=layout, title='Daily statistics')
 
-    return tab
+    return tab, refresh
@@ -0,0 +1,113 @@
+import numpy as np
+
+# Resolutions a timeseries can be shown at, from the finest to the coarsest, with the number of days in one of their points
+RESOLUTIONS = [('D', 'Daily', 1), ('W', 'Weekly', 7), ('M', 'Monthly', 31)]
+RESOLUTION_NAMES = {code: name for code, name, _ in RESOLUTIONS}
+
+# A plot is sent the visible range and as much on either side of it, so that panning doesn't immediately run out of data
+MARGIN_SPANS = 1
+
+# Share of the span of the dates which is left empty around them when a plot shows all of them, like Bokeh's automatic ranges do
+RANGE_PADDING = 0.1
+
+
+# Converts the milliseconds since epoch of a datetime plot range to a day
+def ms_to_day(ms):
+    return np.datetime64(int(ms), 'ms').astype('datetime64[D]')
+
+
+# The (start, end) milliseconds since epoch of a datetime plot range which shows all of the sorted dates
+def full_range_ms(dates):
+    start, end = dates[[0, -1]].astype('datetime64[ms]').astype(np.int64).tolist()
+    padding = max((end - start) * RANGE_PADDING / 2, 12 * 60 * 60 * 1000)
+    return start - padding, end + padding
+
+
+# The finest resolution at which the visible span still fits into maxPoints
+def choose_resolution(spanDays, maxPoints):
+    for code, _, days in RESOLUTIONS:
+        if spanDays / days <= maxPoints:
+            return code
+    return RESOLUTIONS[-1][0]
+
+
+# Picks the rows of sorted dates which should be sent to a plot showing visibleRange, a (start, end) pair of days, or all of the
+# dates if it is None. Returns the slice of rows and the resolution to show them at
+def level_of_detail(dates, visibleRange, maxPoints):
+    if len(dates) == 0:
+        return slice(0, 0), RESOLUTIONS[0][0]
+
+    start, end = (dates[0], dates[-1]) if visibleRange is None else visibleRange
+    spanDays = max(int((end - start) / np.timedelta64(1, 'D')), 1)
+    margin = np.timedelta64(spanDays * MARGIN_SPANS, 'D')
+    window = slice(np.searchsorted(dates, start - margin, side='left'), np.searchsorted(dates, end + margin, side='right'))
+    return window, choose_resolution(spanDays, maxPoints)
+
+
+# The first day of the week (starting on Monday) or month of every date
+def bucket_dates(dates, resolution):
+    if resolution == 'W':
+        days = dates.astype(np.int64)
+        # 1970-01-01 was a Thursday
+        return (days - (days + 3) % 7).astype('datetime64[D]')
+    if resolution == 'M':
+        return dates.astype('datetime64[M]').astype('datetime64[D]')
+    return dates
+
+
+# Sums the rows of values whose sorted dates fall into the same bucket of the resolution
+def aggregate(dates, values, resolution):
+    if resolution == 'D' or len(dates) == 0:
+        return dates, values
+    buckets = bucket_dates(dates, resolution)
+    starts = np.flatnonzero(np.r_[True, buckets[1:] != buckets[:-1]])
+    return buckets[starts], np.add.reduceat(values, starts, axis=0)
+
+
+# Largest-Triangle-Three-Buckets (Steinarsson, 2013): picks threshold of the points which keep the visual shape of the line.
+# Returns the indices of the picked points
+def lttb(x, y, threshold):
+    n = len(x)
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    # The first and last points are always kept, the rest are split into threshold - 2 buckets
+    edges = np.linspace(1, n - 1, threshold - 1).astype(np.int64)
+    rez = np.empty(threshold, dtype=np.int64)
+    rez[0] = 0
+    rez[-1] = n - 1
+    for i in range(threshold - 2):
+        start, end = edges[i], edges[i + 1]
+        # The third point of the triangle is the average of the next bucket
+        nextEnd = edges[i + 2] if i + 2 < len(edges) else n
+        avgX = x[end:nextEnd].mean()
+        avgY = y[end:nextEnd].mean()
+        prevX, prevY = x[rez[i]], y[rez[i]]
+        areas = np.abs((prevX - avgX) * (y[start:end] - prevY) - (prevX - x[start:end]) * (avgY - prevY))
+        rez[i + 1] = start + np.argmax(areas)
+    return rez
+
+
+# Bounds the number of rows of a days x series matrix of counts shown in visibleRange. The counts are summed into weeks or
+# months if the visible days don't fit, and if even that is too many, the rows which keep the shape of the total are picked.
+# Returns the dates, counts and resolution to show
+def downsample_counts(dates, counts, visibleRange, maxPoints):
+    window, resolution = level_of_detail(dates, visibleRange, maxPoints)
+    dates, counts = aggregate(dates[window], counts[window], resolution)
+
+    limit = (2 * MARGIN_SPANS + 1) * maxPoints
+    if len(dates) > limit:
+        keep = lttb(dates.astype(np.int64), counts.sum(axis=1), limit)
+        dates, counts = dates[keep], counts[keep]
+    return dates, counts, resolution
+
+
+# Bounds the number of points of a line of values, like averages, which can't be summed into coarser resolutions
+def downsample_line(dates, values, visibleRange, maxPoints):
+    window, _ = level_of_detail(dates, visibleRange, maxPoints)
+    dates, values = dates[window], values[window]
+
+    keep = lttb(dates.astype(np.int64), values, (2 * MARGIN_SPANS + 1) * maxPoints)
+    return dates[keep], values[keep]
@@ -0,0 +1,48 @@
+from collections import defaultdict
+
+import numpy as np
+
+
+# Statistics across all conversations, merged from the aggregates every conversation already has, so that building them costs
+# as much as the number of conversations, months and participants, not the number of messages
+class GlobalStats:
+    # convoRegistry has to be sorted by message count, the ranking keeps its order
+    def __init__(self, convoRegistry):
+        convos = list(convoRegistry)
+        labels = dict(convoRegistry.select_options())
+
+        self.totalConvos = len(convos)
+        self.totalMessages = sum(x.totalMessages for x in convos)
+
+        # Conversations ranked by the number of messages in them
+        self.convoIds = [x.id for x in convos]
+        self.convoLabels = [labels[x.id] for x in convos]
+        self.convoMessageCounts = np.array([x.totalMessages for x in convos], dtype=np.int64)
+
+        # Messages of all conversations per month, with a row for every month from the first message in any conversation to the last
+        self.monthlyMonths = np.empty(0, dtype='datetime64[M]')
+        self.monthlyCounts = np.zeros(0, dtype=np.int64)
+        # Number of conversations with messages in every month
+        self.monthlyActiveConvos = np.zeros(0, dtype=np.int64)
+        months = np.concatenate([x.monthlyMonths for x in convos]) if convos else self.monthlyMonths
+        if len(months) > 0:
+            firstMonth = months.min()
+            self.monthlyMonths = np.arange(firstMonth, months.max() + 1)
+            # The months of all conversations are summed at once, by their offset from the first month
+            offsets = (months - firstMonth).astype(np.int64)
+            convoMonthlyCounts = np.concatenate([x.monthlyCounts.sum(axis=1) for x in convos])
+            self.monthlyCounts = np.bincount(offsets, weights=convoMonthlyCounts, minlength=len(self.monthlyMonths)).astype(np.int64)
+            self.monthlyActiveConvos = np.bincount(offsets[convoMonthlyCounts > 0], minlength=len(self.monthlyMonths))
+
+        # Participants ranked by the number of messages they sent in all conversations, along with the number of conversations
+        # they sent messages in
+        messageCounts = defaultdict(int)
+        convoCounts = defaultdict(int)
+        for convo in convos:
+            for sender, count in convo.countsBySender.items():
+                messageCounts[sender] += count
+                convoCounts[sender] += 1
+        contacts = sorted(messageCounts, key=lambda x: (-messageCounts[x], x))
+        self.contactNames = contacts
+        self.contactMessageCounts = np.array([messageCounts[x] for x in contacts], dtype=np.int64)
+        self.contactConvoCounts = np.array([convoCounts[x] for x in contacts], dtype=np.int64)
@@ -0,0 +1,63 @@
+import functools
+import os
+
+# Stopword lists shipped with the app, one word per line in stopwords/<language>.txt. Adding a language only needs a new file
+STOPWORDS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'stopwords')
+
+# Language setting which makes the analysis pick the languages of every conversation itself
+AUTO_LANGUAGES = 'auto'
+
+# A conversation is considered written in every language whose stopwords make up at least this part of the share of the best
+# scoring language
+DETECTION_MIN_RELATIVE_SHARE = 0.1
+
+
+def available_languages():
+    return sorted(os.path.splitext(x)[0] for x in os.listdir(STOPWORDS_DIR) if x.endswith('.txt'))
+
+
+# The stopwords of a language, read from disk the first time they are needed
+@functools.lru_cache(maxsize=None)
+def stopwords(language):
+    path = os.path.join(STOPWORDS_DIR, f'{language}.txt')
+    if not os.path.exists(path):
+        raise ValueError(f'No stopwords for language {language}, available languages: {", ".join(available_languages())}')
+    with open(path, encoding='utf-8') as f:
+        return frozenset(line.strip() for line in f if line.strip())
+
+
+# One set for all languages of a conversation, so that removing stopwords costs the same no matter how many languages there are
+@functools.lru_cache(maxsize=None)
+def combined_stopwords(languages):
+    return frozenset().union(*(stopwords(x) for x in languages))
+
+
+# The stopwords of a language which aren't stopwords of any other available language. Short words like "to" or "go" are stopwords
+# in several languages, counting them for all of them would make every language look used
+@functools.lru_cache(maxsize=None)
+def distinctive_stopwords(language):
+    return stopwords(language).difference(*(stopwords(x) for x in available_languages() if x != language))
+
+
+# Picks the languages whose distinctive stopwords make up a large enough share of the used words, compared to the language which
+# is used the most. Function words are the most common words of any language, so even a conversation which mixes languages uses
+# plenty of stopwords of each one. stopwordCounts are the uses of the stopwords of all languages, out of totalWords used words
+def detect_languages(stopwordCounts, totalWords, minRelativeShare=DETECTION_MIN_RELATIVE_SHARE):
+    if totalWords == 0:
+        return ()
+
+    shares = {}
+    for language in available_languages():
+        shares[language] = sum(stopwordCounts[x] for x in distinctive_stopwords(language)) / totalWords
+
+    bestShare = max(shares.values())
+    rez = tuple(sorted(x for x, share in shares.items() if share > 0 and share >= minRelativeShare * bestShare))
+    # A conversation of emoji and links might not use any distinctive stopwords, some language is better than none
+    return rez or (max(shares, key=shares.get),)
+
+
+# Turns the languages option into the languages of a conversation
+def resolve_languages(languages, stopwordCounts, totalWords):
+    if languages == AUTO_LANGUAGES:
+        return detect_languages(stopwordCounts, totalWords)
+    return tuple(languages)
@@ -0,0 +1,33 @@
+from bokeh.models.widgets import Tabs
+
+
+# Tabs which share the conversation selection. When the selected conversation changes, only the visible tab is recomputed,
+# the other tabs are marked as stale and refreshed once the user switches to them
+class LazyTabs:
+    def __init__(self, convoSelection):
+        self.tabs = Tabs(tabs=[])
+        self._refreshers = []
+        self._isStale = []
+
+        convoSelection.on_change('value', self._on_conversation_changed)
+        self.tabs.on_change('active', self._on_active_tab_changed)
+
+    # refresh recomputes the tab for the currently selected conversation; tabs which don't depend on it pass None
+    def add(self, tab, refresh=None):
+        self.tabs.tabs = self.tabs.tabs + [tab]
+        self._refreshers.append(refresh)
+        self._isStale.append(False)
+
+    def _refresh(self, i):
+        if self._refreshers[i] is not None:
+            self._refreshers[i]()
+        self._isStale[i] = False
+
+    def _on_conversation_changed(self, attr, oldValue, newValue):
+        for i in range(len(self._isStale)):
+            self._isStale[i] = self._refreshers[i] is not None
+        self._refresh(self.tabs.active)
+
+    def _on_active_tab_changed(self, attr, oldValue, newValue):
+        if self._isStale[newValue]:
+            self._refresh(newValue)
@@ -0,0 +1,82 @@
+import datetime
+
+import numpy as np
+
+from bokeh.layouts import column, row
+from bokeh.models import Button, DatePicker, Div, NumericInput
+
+MESSAGES_PAGE_SIZE = 100
+
+
+# Browses the messages of a date range one page at a time. Only the current page is rendered and sent to the client, and
+# pages are found by their position in the message store or by date through its day index, so large ranges cost the same as small ones
+class MessageViewer:
+    def __init__(self, messages, pageSize=MESSAGES_PAGE_SIZE):
+        self.messages = messages
+        self.positions = None
+        self.pageSize = pageSize
+        self.offset = 0
+
+        self.pageDisplay = Div(sizing_mode='stretch_width')
+        self.positionDisplay = Div()
+        self.previousButton = Button(label='Previous', width=90)
+        self.nextButton = Button(label='Next', width=90)
+        self.offsetInput = NumericInput(title='Go to message', mode='int', low=1, width=120)
+        self.datePicker = DatePicker(title='Go to date', width=150)
+
+        self.previousButton.on_click(lambda event: self.go_to_offset(self.offset - self.pageSize))
+        self.nextButton.on_click(lambda event: self.go_to_offset(self.offset + self.pageSize))
+        self.offsetInput.on_change('value', self._on_offset_changed)
+        self.datePicker.on_change('value', self._on_date_changed)
+
+        self.controls = column(row(self.previousButton, self.nextButton, self.positionDisplay),
+                               row(self.offsetInput, self.datePicker))
+        self.show(messages)
+
+    # Shows the first page of another range of messages. If positions are given, only the messages at those positions are shown,
+    # e.g. the results of a search
+    def show(self, messages, positions=None):
+        self.messages = messages
+        self.positions = positions
+        days = messages.days if positions is None else messages.days[positions]
+        if len(days) > 0:
+            self.datePicker.min_date = datetime.date.fromordinal(int(days[0]))
+            self.datePicker.max_date = datetime.date.fromordinal(int(days[-1]))
+        self.offsetInput.high = max(self._count(), 1)
+        self.go_to_offset(0)
+
+    def _count(self):
+        return len(self.messages) if self.positions is None else len(self.positions)
+
+    def go_to_offset(self, offset):
+        self.offset = max(min(offset, self._count() - 1), 0)
+        self._render()
+
+    def go_to_date(self, date):
+        if self.positions is None:
+            self.go_to_offset(self.messages.offset_of(date))
+        else:
+            self.go_to_offset(int(np.searchsorted(self.messages.days[self.positions], date.toordinal(), side='left')))
+
+    def _on_offset_changed(self, attr, old, new):
+        if new is not None:
+            self.go_to_offset(new - 1)
+
+    def _on_date_changed(self, attr, old, new):
+        if new is not None:
+            self.go_to_date(datetime.date.fromisoformat(str(new)))
+
+    def _render(self):
+        end = min(self.offset + self.pageSize, self._count())
+        if self.positions is None:
+            pageMessages = self.messages[self.offset:end]
+        else:
+            pageMessages = [self.messages[int(x)] for x in self.positions[self.offset:end]]
+        # TODO: A single long word will make the div ignore width settings and overflow the window
+        lines = [f'<b>{message.sender}</b> <i>({message.datetime.strftime("%Y/%m/%d %H:%M")})</i>: {message.content} </br>'
+                 for message in pageMessages]
+        self.pageDisplay.text = '<p style="overflow-wrap:break-word;width:95%;">' + ''.join(lines) + '</p>'
+
+        self.positionDisplay.text = f'Messages {self.offset + 1 if end > 0 else 0}-{end} of {self._count()}'
+        self.previousButton.disabled = self.offset == 0
+        self.nextButton.disabled = end >= self._count()
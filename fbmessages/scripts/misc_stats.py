@@ -1,41 +1,42 @@
 import numpy as np
-import pandas as pd
 import datetime
-import heapq
 from math import pi
-from operator import itemgetter
 
 from bokeh.layouts import column, row
 from bokeh.plotting import figure
 from bokeh.models import ColumnDataSource, HoverTool, Select, Panel, Slider
+from bokeh.events import RangesUpdate, Reset
 
+from scripts.analyser import MAX_TOP_WORDS_MIN_LENGTH
+from scripts.downsampling import downsample_line, full_range_ms, ms_to_day
 from scripts.plot_style import style
 
+SENTIMENT_PLOT_WIDTH = 550
 
-def misc_stats_tab(convoStats, convoSelection):
-    conversationTitles = sorted([x.title for x in convoStats])
 
-    def make_sentiment_dataset(convoTitle):
-        convo = next((x for x in convoStats if x.title == convoTitle))
+def misc_stats_tab(convoRegistry, convoSelection):
 
-        xdataSentiment = sorted([pd.to_datetime(x)
-                                 for x in convo.dailySentiments.keys()])
-        ydataSentiment = [convo.dailySentiments[x]
-                          for x in convo.dailySentiments.keys()]
+    # Daily sentiments in visibleRange, a (start, end) pair of days or None for the whole conversation. Long ranges are
+    # downsampled to the points which keep the shape of the line
+    def make_sentiment_dataset(convoId, visibleRange=None):
+        convo = convoRegistry[convoId]
+
+        xdataSentiment, ydataSentiment = downsample_line(convo.dailyDates, convo.dailySentimentValues, visibleRange,
+                                                         SENTIMENT_PLOT_WIDTH)
 
         return ColumnDataSource(data={'date': xdataSentiment, 'sentiment': ydataSentiment})
 
-    def make_common_words_dataset(convoTitle, minLen=0):
-        convo = next((x for x in convoStats if x.title == convoTitle))
+    def make_common_words_dataset(convoId, minLen=0):
+        convo = convoRegistry[convoId]
 
-        top_words = heapq.nlargest(20, filter(
-            lambda x: len(x[0]) >= minLen, convo.wordFrequencies.items()), key=itemgetter(1))
+        # The tables are ranked by the analyser, the slider only picks one of them
+        topWords = convo.topWordsByMinLength[minLen]
 
-        xdata_top_words, ydata_top_words = zip(*reversed(top_words))
+        xdata_top_words, ydata_top_words = zip(*reversed(topWords))
         return ColumnDataSource(data={'word': xdata_top_words, 'count': ydata_top_words})
 
     def make_sentiment_plot(src):
-        p = figure(plot_width=550, plot_height=550, title='Daily VADER sentiment', y_range=(-1, 1),
+        p = figure(plot_width=SENTIMENT_PLOT_WIDTH, plot_height=550, title='Daily VADER sentiment', y_range=(-1, 1),
                    x_axis_type='datetime', x_axis_label='Date', y_axis_label='Sentiment value')
 
         p.line(x='date', y='sentiment', source=src,
@@ -65,37 +66,54 @@ def misc_stats_tab(convoStats, convoSelection):
 
         return p
 
-    def on_conversation_changed(attr, oldValue, newValue):
-        newSentimentSrc = make_sentiment_dataset(newValue)
+    # Shows the most common words of another conversation or word length without rebuilding the figure
+    def update_common_words(convoId, minLen):
+        newCommonWordsSrc = make_common_words_dataset(convoId, minLen)
+        commonWordsSrc.data.update(newCommonWordsSrc.data)
+        commonWordsPlot.y_range.factors = list(newCommonWordsSrc.data['word'])
+        commonWordsPlot.title.text = f'Most common words with len >= {minLen}'
+
+    # Shows the whole conversation, without the zoom of the previously shown one. The plot's own reset would only go back to
+    # the part of the conversation which was sent for the zoom
+    def reset_sentiment_range():
+        newSentimentSrc = make_sentiment_dataset(convoSelection.value)
         sentimentSrc.data.update(newSentimentSrc.data)
+        dates = convoRegistry[convoSelection.value].dailyDates
+        if len(dates) > 0:
+            sentimentPlot.x_range.start, sentimentPlot.x_range.end = full_range_ms(dates)
 
-        newCommonWordsSrc = make_common_words_dataset(
-            newValue, wordLengthSlider.value)
-        plotRow.children = [sentimentPlot, make_common_words_plot(
-            newCommonWordsSrc, wordLengthSlider.value)]
+    # Called when the selected conversation changes while this tab is visible, or when this tab is switched to after it changed
+    def refresh():
+        reset_sentiment_range()
 
-    def on_word_length_changed(attr, oldValue, newValue):
-        newCommonWordsSrc = make_common_words_dataset(
-            convoSelection.value, newValue)
-        plotRow.children = [sentimentPlot, make_common_words_plot(
-            newCommonWordsSrc, newValue)]
+        update_common_words(convoSelection.value, wordLengthSlider.value)
+
+    def on_sentiment_ranges_update(event):
+        newSentimentSrc = make_sentiment_dataset(convoSelection.value, (ms_to_day(event.x0), ms_to_day(event.x1)))
+        sentimentSrc.data.update(newSentimentSrc.data)
+
+    def on_sentiment_reset(event):
+        reset_sentiment_range()
 
-    convoSelection.on_change('value', on_conversation_changed)
+    def on_word_length_changed(attr, oldValue, newValue):
+        update_common_words(convoSelection.value, newValue)
 
     initialWordLength = 5
     wordLengthSlider = Slider(title='Min word length for common words',
-                              start=0, end=10, value=initialWordLength, step=1)
+                              start=0, end=MAX_TOP_WORDS_MIN_LENGTH, value=initialWordLength, step=1)
     wordLengthSlider.on_change('value_throttled', on_word_length_changed)
 
-    sentimentSrc = make_sentiment_dataset(conversationTitles[0])
+    sentimentSrc = make_sentiment_dataset(convoSelection.value)
     sentimentPlot = make_sentiment_plot(sentimentSrc)
+    sentimentPlot.on_event(RangesUpdate, on_sentiment_ranges_update)
+    sentimentPlot.on_event(Reset, on_sentiment_reset)
 
     commonWordsSrc = make_common_words_dataset(
-        conversationTitles[0], initialWordLength)
+        convoSelection.value, initialWordLength)
     commonWordsPlot = make_common_words_plot(commonWordsSrc, initialWordLength)
 
     plotRow = row(sentimentPlot, commonWordsPlot)
     layout = column(row(convoSelection, wordLengthSlider), plotRow)
     tab = Panel(child=layout, title='Misc statistics')
 
-    return tab
+    return tab, refresh
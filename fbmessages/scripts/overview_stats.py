@@ -0,0 +1,114 @@
+from math import pi
+
+from bokeh.layouts import column, row
+from bokeh.plotting import figure
+from bokeh.models import ColumnDataSource, Div, FactorRange, HoverTool, Panel, Slider
+
+# How many of the busiest conversations and contacts are shown by default
+OVERVIEW_TOP_COUNT = 20
+MAX_OVERVIEW_TOP_COUNT = 100
+
+
+# Statistics across all conversations. They don't depend on the selected conversation, so the tab has nothing to refresh
+def overview_stats_tab(convoRegistry):
+    globalStats = convoRegistry.globalStats
+
+    def make_ranking_dataset(topCount):
+        counts = globalStats.convoMessageCounts[:topCount]
+        shares = counts / max(globalStats.totalMessages, 1) * 100
+        # Reversed, so that the busiest conversation is at the top
+        return ColumnDataSource(data={'convo': globalStats.convoLabels[:topCount][::-1],
+                                      'count': counts[::-1], 'share': shares[::-1]})
+
+    def make_contacts_dataset(topCount):
+        return ColumnDataSource(data={'contact': globalStats.contactNames[:topCount][::-1],
+                                      'count': globalStats.contactMessageCounts[:topCount][::-1],
+                                      'convoCount': globalStats.contactConvoCounts[:topCount][::-1]})
+
+    def make_monthly_dataset():
+        return ColumnDataSource(data={'month': globalStats.monthlyMonths.astype('datetime64[D]'),
+                                      'count': globalStats.monthlyCounts,
+                                      'activeConvos': globalStats.monthlyActiveConvos})
+
+    def make_totals_text():
+        rez = '<p>'
+        rez += f'Conversations: {globalStats.totalConvos}</br>'
+        rez += f'Total messages: {globalStats.totalMessages}</br>'
+        rez += f'Participants: {len(globalStats.contactNames)}</br>'
+        if len(globalStats.monthlyMonths) > 0:
+            rez += f'Messages per month: {globalStats.totalMessages / len(globalStats.monthlyMonths):.1f}</br>'
+        rez += '</p>'
+        return rez
+
+    def _make_ranking_plot(src, factorColumn, title, yLabel, tooltips):
+        p = figure(plot_width=550, plot_height=550, title=title, toolbar_location=None,
+                   y_range=FactorRange(factors=list(src.data[factorColumn])), x_axis_label='Message count', y_axis_label=yLabel)
+
+        p.hbar(y=factorColumn, right='count', height=0.9, source=src,
+               fill_alpha=0.7, hover_fill_color='green', hover_fill_alpha=1.0)
+
+        p.grid.grid_line_alpha = 0
+        p.outline_line_alpha = 0
+
+        hover = HoverTool(tooltips=tooltips)
+        p.add_tools(hover)
+
+        return p
+
+    def make_ranking_plot(src):
+        return _make_ranking_plot(src, 'convo', 'Busiest conversations', 'Conversation',
+                                  [('Conversation', '@convo'), ('Message count', '@count'), ('Share of all messages', '@share{0.0}%')])
+
+    def make_contacts_plot(src):
+        return _make_ranking_plot(src, 'contact', 'Messages by participant', 'Participant',
+                                  [('Participant', '@contact'), ('Message count', '@count'), ('Conversations', '@convoCount')])
+
+    def make_monthly_plot(src):
+        p = figure(plot_width=550, plot_height=550, title='Monthly messages in all conversations', toolbar_location=None,
+                   x_axis_type='datetime', x_axis_label='Date', y_axis_label='Message count')
+
+        # The bars are a bit narrower than the shortest month
+        p.vbar(x='month', top='count', width=27*24*60*60*1000, source=src,
+               fill_alpha=0.7, hover_fill_color='green', hover_fill_alpha=1.0)
+
+        p.y_range.start = 0
+        p.xaxis.major_label_orientation = pi/4
+        p.grid.grid_line_alpha = 0
+        p.outline_line_alpha = 0
+
+        hover = HoverTool(tooltips=[('Month', '@month{%Y-%m}'), ('Message count', '@count'), ('Active conversations', '@activeConvos')],
+                          formatters={'@month': 'datetime'})
+        p.add_tools(hover)
+
+        return p
+
+    # Shows another number of conversations and contacts without rebuilding the figures
+    def on_top_count_changed(attr, oldValue, newValue):
+        newRankingSrc = make_ranking_dataset(newValue)
+        rankingSrc.data.update(newRankingSrc.data)
+        rankingPlot.y_range.factors = list(newRankingSrc.data['convo'])
+
+        newContactsSrc = make_contacts_dataset(newValue)
+        contactsSrc.data.update(newContactsSrc.data)
+        contactsPlot.y_range.factors = list(newContactsSrc.data['contact'])
+
+    topCountSlider = Slider(title='Conversations and participants shown', start=1, end=MAX_OVERVIEW_TOP_COUNT,
+                            value=OVERVIEW_TOP_COUNT, step=1)
+    topCountSlider.on_change('value_throttled', on_top_count_changed)
+
+    rankingSrc = make_ranking_dataset(OVERVIEW_TOP_COUNT)
+    rankingPlot = make_ranking_plot(rankingSrc)
+
+    contactsSrc = make_contacts_dataset(OVERVIEW_TOP_COUNT)
+    contactsPlot = make_contacts_plot(contactsSrc)
+
+    monthlySrc = make_monthly_dataset()
+    monthlyPlot = make_monthly_plot(monthlySrc)
+
+    totalsDisplay = Div(text=make_totals_text())
+
+    plotRow = row(rankingPlot, contactsPlot, monthlyPlot)
+    layout = column(row(topCountSlider, totalsDisplay), plotRow)
+    tab = Panel(child=layout, title='Overview')
+
+    return tab, None
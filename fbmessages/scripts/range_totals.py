@@ -0,0 +1,51 @@
+import datetime
+
+import numpy as np
+
+
+# Cumulative sums of values by day and sender, with a leading row of zeros, so that the totals of days i to j - 1 are
+# rez[j] - rez[i]
+def _cumulative_by_day_and_sender(dayIds, senderIds, weights, dayCount, senderCount):
+    totals = np.bincount(dayIds * senderCount + senderIds, weights=weights, minlength=dayCount * senderCount)
+    totals = totals.reshape(dayCount, senderCount)
+    return np.vstack([np.zeros((1, senderCount)), np.cumsum(totals, axis=0)]).astype(np.int64)
+
+
+# Totals of the messages in a date range, read from RangeTotals
+class RangeTotalsResult:
+    def __init__(self, messageCountsBySenderId, wordCountsBySenderId, initiationsBySenderId, sentimentSum):
+        self.messageCountsBySenderId = messageCountsBySenderId
+        self.wordCountsBySenderId = wordCountsBySenderId
+        self.initiationsBySenderId = initiationsBySenderId
+        self.sentimentSum = sentimentSum
+
+
+# Prefix sums over the days of a MessageStore of the message counts, word counts and initiations of every sender and of the
+# message sentiments. Built once per conversation, they answer the totals of any date range with two lookups per array, so the
+# cost of a range query depends on the number of participants rather than the number of messages in the range
+class RangeTotals:
+    def __init__(self, messages, sessions, dailySentimentSums):
+        self.days = np.unique(messages.days).astype(np.int64)
+        dayIds = np.searchsorted(self.days, messages.days)
+        dayCount, senderCount = len(self.days), len(messages.senders)
+
+        self.messageCounts = _cumulative_by_day_and_sender(dayIds, messages.senderIds, None, dayCount, senderCount)
+        self.wordCounts = _cumulative_by_day_and_sender(dayIds, messages.senderIds, messages.wordCounts, dayCount, senderCount)
+        initiatedStarts = sessions.starts[sessions.initiations]
+        self.initiations = _cumulative_by_day_and_sender(dayIds[initiatedStarts], messages.senderIds[initiatedStarts], None,
+                                                         dayCount, senderCount)
+
+        # Sentiments are summed by days formatted like the keys of the daily aggregates
+        sentimentSums = [dailySentimentSums.get(datetime.date.fromordinal(int(x)).isoformat(), 0.0) for x in self.days]
+        self.sentimentSums = np.concatenate([[0.0], np.cumsum(sentimentSums)])
+
+    # Totals of the messages sent between the dates (inclusive), or of all messages if either date is None
+    def between(self, startDate=None, endDate=None):
+        first, last = 0, len(self.days)
+        if startDate is not None and endDate is not None:
+            first = np.searchsorted(self.days, startDate.toordinal(), side='left')
+            last = np.searchsorted(self.days, endDate.toordinal(), side='right')
+        return RangeTotalsResult(self.messageCounts[last] - self.messageCounts[first],
+                                 self.wordCounts[last] - self.wordCounts[first],
+                                 self.initiations[last] - self.initiations[first],
+                                 self.sentimentSums[last] - self.sentimentSums[first])
@@ -0,0 +1,71 @@
+from array import array
+
+import numpy as np
+
+from scripts.tokenizer import TOKENIZE_CHUNK_SIZE, tokenize
+
+
+# Inverted index from the words of a conversation to the positions of the messages containing them in its MessageStore.
+# Words are normalised by the tokenizer, the same way for the messages and for the queries. Posting lists are compact
+# arrays of 32 bit positions, so the index pickles into the analysis cache along with the conversation
+class SearchIndex:
+    def __init__(self):
+        self.postings = {}  # word -> array('I') of ascending message positions
+
+    # Adds the words of consecutive messages stored from firstPosition on, in store order. words and tokenCounts are those of
+    # a TokenizedBatch. The messages have to be newer than the ones already indexed, so that the posting lists stay sorted
+    def add(self, words, tokenCounts, firstPosition):
+        positions = np.repeat(np.arange(firstPosition, firstPosition + len(tokenCounts)), tokenCounts).tolist()
+        postings = self.postings
+        for word, position in zip(words, positions):
+            if not word:
+                continue
+            posting = postings.get(word)
+            if posting is None:
+                postings[word] = array('I', [position])
+            elif posting[-1] != position:
+                posting.append(position)
+
+    def lookup(self, word):
+        posting = self.postings.get(word)
+        if posting is None:
+            return np.empty(0, dtype=np.int64)
+        return np.frombuffer(posting, dtype=np.uint32).astype(np.int64)
+
+    # Ascending positions of the messages which contain every word of the query
+    def query(self, query):
+        words = query_words(query)
+        if not words:
+            return np.empty(0, dtype=np.int64)
+
+        # Intersecting the shortest posting lists first keeps the intermediate results small
+        postingLists = sorted((self.lookup(x) for x in words), key=len)
+        rez = postingLists[0]
+        for posting in postingLists[1:]:
+            if len(rez) == 0:
+                break
+            rez = np.intersect1d(rez, posting, assume_unique=True)
+        return rez
+
+
+def query_words(query):
+    return {x for x in tokenize([query]).words if x}
+
+
+# Positions of the messages of the conversation which contain every word of the query. Conversations analysed without a
+# search index are scanned instead, a chunk of messages at a time
+def search_messages(convo, query):
+    if convo.searchIndex is not None:
+        return convo.searchIndex.query(query)
+
+    words = query_words(query)
+    messages = convo.messages
+    rez = []
+    if not words:
+        return np.array(rez, dtype=np.int64)
+    for start in range(0, len(messages), TOKENIZE_CHUNK_SIZE):
+        end = min(start + TOKENIZE_CHUNK_SIZE, len(messages))
+        tokens = tokenize([messages.content(i) for i in range(start, end)])
+        starts = np.cumsum([0] + tokens.tokenCounts).tolist()
+        rez += [start + i for i in range(end - start) if words.issubset(tokens.words[starts[i]:starts[i + 1]])]
+    return np.array(rez, dtype=np.int64)
@@ -0,0 +1,122 @@
+from collections import namedtuple
+
+import numpy as np
+
+# It is assumed that if 4h passed since last message, a new conversation has been initiated
+NEW_CONVERSATION_GAP_MS = 4*60*60*1000
+
+# How messages are split into conversations (sessions) and which session starts count as initiations.
+# gapMs: a message sent at least this long after the previous one starts a new conversation.
+# requireMultipleParticipants: a new conversation only counts as initiated if more than one person spoke since the last initiation,
+# otherwise it is someone carrying on talking to themselves.
+# questionContinues: a new conversation doesn't count as initiated if the message before it was a question, since it is an answer
+SegmentationRules = namedtuple('SegmentationRules', ['gapMs', 'requireMultipleParticipants', 'questionContinues'],
+                               defaults=[NEW_CONVERSATION_GAP_MS, True, True])
+
+
+# Positions of the messages which start a new conversation, from their sorted timestamps. previousTimestamp is the time of the
+# message before the first one, if there is one
+def session_starts(timestamps, gapMs=NEW_CONVERSATION_GAP_MS, previousTimestamp=None):
+    timestamps = np.asarray(timestamps, dtype=np.int64)
+    if len(timestamps) == 0:
+        return np.empty(0, dtype=np.int64)
+    isStart = np.empty(len(timestamps), dtype=bool)
+    isStart[0] = previousTimestamp is None or timestamps[0] - previousTimestamp >= gapMs
+    np.greater_equal(np.diff(timestamps), gapMs, out=isStart[1:])
+    return np.flatnonzero(isStart)
+
+
+# Conversation statistics of a range of messages, durations are in seconds. Only conversations which ended within the range are
+# counted, the last one is still going on as far as the range is concerned
+class SessionSummary:
+    def __init__(self):
+        self.convoCount = 0
+        self.convoDurationSum = 0
+        self.convoLenWordsSum = 0
+        self.pauseBetweenConvosDurationSum = 0
+        self.pauseBetweenMessagesInConvoSum = 0
+        self.lastConvoPauseBetweenMessagesSum = 0
+
+
+# Prepends a zero to the cumulative sum, so that the sum of values[i:j] is rez[j] - rez[i]
+def _prefix_sums(values):
+    return np.concatenate([[0], np.cumsum(values)])
+
+
+# The conversations of a MessageStore, computed once so that the statistics of any range of messages are found from the session
+# boundaries and prefix sums over the sessions, in constant time, instead of going through the messages
+class SessionIndex:
+    def __init__(self, messages, rules=SegmentationRules()):
+        self.rules = rules
+        self.starts = session_starts(messages.timestamps, rules.gapMs)
+        self.initiations = self._find_initiations(messages)
+        # cumulativeWordCounts[i] is the number of words in the messages before position i
+        self.cumulativeWordCounts = _prefix_sums(messages.wordCounts.astype(np.int64))
+
+        # Prefix sums over whole sessions
+        timestamps = messages.timestamps
+        ends = np.append(self.starts[1:], len(messages))[:len(self.starts)].astype(np.int64)  # exclusive
+        durations = (timestamps[ends - 1] - timestamps[self.starts]) / 1000.0
+        pausesBefore = np.zeros(len(self.starts))
+        pausesBefore[1:] = (timestamps[self.starts[1:]] - timestamps[self.starts[1:] - 1]) / 1000.0
+        self.cumulativeDurations = _prefix_sums(durations)
+        self.cumulativeWordsPerSession = _prefix_sums(self.cumulativeWordCounts[ends] - self.cumulativeWordCounts[self.starts])
+        # The pauses between the messages of a conversation add up to its duration
+        self.cumulativeAveragePauses = _prefix_sums(durations / np.maximum(ends - self.starts, 1))
+        self.cumulativePausesBefore = _prefix_sums(pausesBefore)
+
+    # Which sessions were initiated according to the rules. The checks depend on the previous initiation, so they are made
+    # session by session, but on the participants of every session, which are found for all sessions at once
+    def _find_initiations(self, messages):
+        rez = np.zeros(len(self.starts), dtype=bool)
+        if len(self.starts) == 0:
+            return rez
+        rez[0] = True
+        if not self.rules.requireMultipleParticipants and not self.rules.questionContinues:
+            rez[:] = True
+            return rez
+
+        sessionIds = np.repeat(np.arange(len(self.starts)), np.diff(np.append(self.starts, len(messages))))
+        senderCount = max(len(messages.senders), 1)
+        sessionSenderPairs = np.unique(sessionIds * senderCount + messages.senderIds)
+        sessionParticipants = np.split(sessionSenderPairs % senderCount,
+                                       np.searchsorted(sessionSenderPairs // senderCount, np.arange(1, len(self.starts))))
+
+        participantsSinceInitiation = set()
+        for i in range(1, len(self.starts)):
+            participantsSinceInitiation.update(sessionParticipants[i - 1].tolist())
+            if self.rules.requireMultipleParticipants and len(participantsSinceInitiation) <= 1:
+                continue
+            if self.rules.questionContinues and '?' in messages.content(self.starts[i] - 1):
+                continue
+            rez[i] = True
+            participantsSinceInitiation = set()
+        return rez
+
+    # Statistics of the conversations of messages[start:end]. The range is treated as a conversation of its own: its first
+    # message starts a conversation even if it continues one from before the range, so the first conversation of the range may
+    # be the tail of a session. The others are whole sessions, up to the last one which is cut off by the end of the range
+    def summarise(self, messages, start, end):
+        rez = SessionSummary()
+        if start >= end:
+            return rez
+
+        timestamps = messages.timestamps
+        # Sessions first to last - 1 start within the range, after its first message
+        first = np.searchsorted(self.starts, start, side='right')
+        last = np.searchsorted(self.starts, end, side='left')
+        lastConvoStart = start
+
+        rez.convoCount = int(last - first)
+        if last > first:
+            headEnd = self.starts[first]
+            headDuration = (timestamps[headEnd - 1] - timestamps[start]) / 1000.0
+            rez.convoDurationSum = headDuration + self.cumulativeDurations[last - 1] - self.cumulativeDurations[first]
+            rez.convoLenWordsSum = int(self.cumulativeWordCounts[headEnd] - self.cumulativeWordCounts[start] +
+                                       self.cumulativeWordsPerSession[last - 1] - self.cumulativeWordsPerSession[first])
+            rez.pauseBetweenConvosDurationSum = self.cumulativePausesBefore[last] - self.cumulativePausesBefore[first]
+            rez.pauseBetweenMessagesInConvoSum = (headDuration / (headEnd - start) +
+                                                  self.cumulativeAveragePauses[last - 1] - self.cumulativeAveragePauses[first])
+            lastConvoStart = self.starts[last - 1]
+        rez.lastConvoPauseBetweenMessagesSum = (timestamps[end - 1] - timestamps[lastConvoStart]) / 1000.0
+        return rez
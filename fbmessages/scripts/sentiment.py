@@ -0,0 +1,77 @@
+from vaderSentiment.vaderSentiment import SentimentIntensityAnalyzer
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+# Only short contents are memoised: those are the ones which repeat ("ok", "haha", emoji), while long messages are almost always unique
+MEMO_MAX_CONTENT_LENGTH = 64
+MEMO_MAX_SIZE = 500000
+
+_sentiment_analyzer = None
+
+
+def _get_analyzer():
+    global _sentiment_analyzer
+    if _sentiment_analyzer is None:
+        _sentiment_analyzer = SentimentIntensityAnalyzer()
+    return _sentiment_analyzer
+
+
+def _score_batch(contents):
+    analyzer = _get_analyzer()
+    return [analyzer.polarity_scores(x)['compound'] for x in contents]
+
+
+# Rudimentary sentiment analysis using VADER. Contents are scored in batches, which are spread over worker processes if there are
+# more than one, and every distinct content is only scored once. Short contents are remembered for as long as the engine lives,
+# which is one analysis run, so the memo doesn't stay in the server process afterwards.
+# The worker processes are started by the first batch that needs them and kept until the engine is closed, since conversations
+# are scored in many batches
+class SentimentEngine:
+    def __init__(self, workers=1, batchSize=5000):
+        self.workers = workers
+        self.batchSize = batchSize
+        self._memo = {}  # compound scores of short contents
+        self._executor = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
+
+    def _score_distinct(self, contents):
+        if self.workers > 1 and len(contents) > self.batchSize:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(max_workers=self.workers)
+            batches = [contents[i:i + self.batchSize] for i in range(0, len(contents), self.batchSize)]
+            return [score for batch in self._executor.map(_score_batch, batches) for score in batch]
+        return _score_batch(contents)
+
+    # Returns the VADER compound score of every content. knownScores maps contents to scores which are already known
+    def score(self, contents, knownScores=None):
+        scores = {}
+        toScore = []
+        for content in contents:
+            if content in scores:
+                continue
+            memoised = self._memo.get(content)
+            if memoised is None and knownScores is not None:
+                memoised = knownScores.get(content)
+            if memoised is None:
+                toScore.append(content)
+                scores[content] = None
+            else:
+                scores[content] = memoised
+
+        for content, score in zip(toScore, self._score_distinct(toScore)):
+            scores[content] = score
+            if len(content) <= MEMO_MAX_CONTENT_LENGTH and len(self._memo) < MEMO_MAX_SIZE:
+                self._memo[content] = score
+
+        return np.fromiter((scores[x] for x in contents), dtype=np.float64, count=len(contents))
@@ -0,0 +1,38 @@
+import string
+
+# Number of messages whose contents are tokenised at once, which bounds the number of words held at a time
+TOKENIZE_CHUNK_SIZE = 10000
+
+
+# The words of a batch of message contents, split once for the whole batch
+class TokenizedBatch:
+    def __init__(self):
+        # Words of all contents, lower case and stripped of surrounding punctuation. The words of content i are
+        # words[starts[i]:starts[i+1]], where starts is the cumulative sum of tokenCounts
+        self.words = []
+        self.tokenCounts = []
+        # Number of whitespace separated words in every content, as shown in the statistics
+        self.wordCounts = []
+
+
+# Contents are split on spaces, so joining them with a space gives the concatenation of the words of every content.
+# This way the whole batch is lower-cased and split in one go instead of once per message
+def tokenize(contents):
+    rez = TokenizedBatch()
+    rez.tokenCounts = [x.count(' ') + 1 for x in contents]
+    rez.wordCounts = [len(x.split()) for x in contents]
+
+    punctuation = string.punctuation
+    # A word might be entirely punctuation; it isn't stripped then
+    rez.words = [word.strip(punctuation) or word for word in ' '.join(contents).lower().split(' ')]
+    return rez
+
+
+# Counts the words which are at least 2 characters long, except for stopwords. Uses of stopwords are counted in stopwordCounts
+# instead, if it is given. Returns the number of words counted in either
+def count_words(words, wordFrequencies, stopwords=frozenset(), stopwordCounts=None):
+    words = [x for x in words if len(x) > 1]
+    if stopwordCounts is not None:
+        stopwordCounts.update([x for x in words if x in stopwords])
+    wordFrequencies.update([x for x in words if x not in stopwords])
+    return len(words)
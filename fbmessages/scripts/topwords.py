@@ -0,0 +1,91 @@
+from collections import Counter
+from collections.abc import Mapping
+
+import heapq
+
+# Words are kept in separate sketches by their length, so that the most common words of any minimum length can be found.
+# The longest bucket holds all words at least this long, which is as far as the word length slider goes
+MAX_WORD_LENGTH_BUCKET = 10
+
+
+# Space-Saving heavy hitters sketch (Metwally et al.), which counts at most capacity distinct words. When a new word arrives
+# while the sketch is full, it replaces the word with the smallest count and inherits that count. Every reported count is at
+# least the real one and overestimates it by at most (total counted words) / capacity, and every word used more often than that
+# is guaranteed to be kept
+class SpaceSaving:
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.counts = {}
+        # (count, word) pairs, which are outdated once the count of the word changes. Counts only grow, so the smallest
+        # up-to-date pair is the word to evict
+        self._heap = []
+
+    def add(self, word, count=1):
+        if word in self.counts:
+            self.counts[word] += count
+        elif len(self.counts) < self.capacity:
+            self.counts[word] = count
+        else:
+            minCount, minWord = self._pop_min()
+            del self.counts[minWord]
+            self.counts[word] = minCount + count
+        heapq.heappush(self._heap, (self.counts[word], word))
+
+        if len(self._heap) > 4 * self.capacity:
+            self._heap = [(val, key) for key, val in self.counts.items()]
+            heapq.heapify(self._heap)
+
+    def _pop_min(self):
+        while True:
+            count, word = heapq.heappop(self._heap)
+            if self.counts.get(word) == count:
+                return count, word
+
+
+# Drop-in replacement for the Counter of word frequencies which uses bounded memory: at most capacity words of every length
+# bucket are kept, and their counts are approximate within the bounds of SpaceSaving
+class BoundedWordFrequencies:
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.buckets = {}
+
+    def _bucket(self, word):
+        length = min(len(word), MAX_WORD_LENGTH_BUCKET)
+        if length not in self.buckets:
+            self.buckets[length] = SpaceSaving(self.capacity)
+        return self.buckets[length]
+
+    # Takes a list of words or a mapping of words to counts, like Counter.update
+    def update(self, words):
+        # Repeated words of a batch are added at once, Space-Saving gives the same guarantees for weighted updates
+        counts = words if isinstance(words, Mapping) else Counter(words)
+        for word, count in counts.items():
+            self._bucket(word).add(word, count)
+
+    def __getitem__(self, word):
+        return self._bucket(word).counts.get(word, 0)
+
+    def __len__(self):
+        return sum(len(x.counts) for x in self.buckets.values())
+
+    def items(self):
+        return ((key, val) for bucket in self.buckets.values() for key, val in bucket.counts.items())
+
+    def values(self):
+        return (val for bucket in self.buckets.values() for val in bucket.counts.values())
+
+
+# The k most common words for every minimum length from 0 to maxMinLen, as a list indexed by the minimum length. The words are
+# grouped by length in one pass, after which every table is merged from the one for the next longer minimum length. Ties are
+# ranked in the order of wordFrequencies
+def top_words_by_min_length(wordFrequencies, k, maxMinLen=MAX_WORD_LENGTH_BUCKET):
+    wordsByLength = [[] for _ in range(maxMinLen + 1)]
+    for index, (word, count) in enumerate(wordFrequencies.items()):
+        wordsByLength[min(len(word), maxMinLen)].append((count, -index, word))
+
+    rez = [None] * (maxMinLen + 1)
+    longer = []
+    for minLen in range(maxMinLen, -1, -1):
+        longer = heapq.nlargest(k, longer + heapq.nlargest(k, wordsByLength[minLen]))
+        rez[minLen] = [(word, count) for count, _, word in longer]
+    return rez
@@ -0,0 +1,17 @@
+import argparse
+
+from scripts.cache import AnalysisCache, DEFAULT_CACHE_DIR
+
+# main.py is run for every browser session, things which should only happen once per server are done here.
+# Only the arguments needed here are parsed, main.py validates all of them
+parser = argparse.ArgumentParser(add_help=False)
+parser.add_argument('--cache-dir', default=DEFAULT_CACHE_DIR)
+parser.add_argument('--no-cache', action='store_true')
+parser.add_argument('--clear-cache', action='store_true')
+args, _ = parser.parse_known_args()
+
+
+def on_server_loaded(server_context):
+    if args.clear_cache and not args.no_cache:
+        print(f'Clearing the analysis cache in {args.cache_dir} ...')
+        AnalysisCache(args.cache_dir).clear()
@@ -0,0 +1,74 @@
+import json
+
+import pytest
+
+from scripts.analyser import fix_mojibake, parse_utf8
+
+# Strings as they were typed, the export stores every byte of their UTF-8 encoding as a separate \u00XX escape
+CORPUS = [
+    'plain ascii',
+    'Ąžuolas, čiū, ėjo į šilą ūkanotą',
+    'Zażółć gęślą jaźń',
+    'Grüße aus Köln, naïve café',
+    'Привет, как дела?',
+    'Καλημέρα κόσμε',
+    'こんにちは世界, 你好, 안녕하세요',
+    'مرحبا بالعالم',
+    'שלום עולם',
+    'नमस्ते दुनिया',
+    '😀😂👍🏽 ❤️ 🇱🇹 👨‍👩‍👧‍👦',
+    'emoji at the end 🎉',
+    '€100 and a ½ — “quoted”',
+    'a backslash \\ in the middle',
+    'ends with a backslash \\',
+    'backslash before a letter \\ą',
+    'a literal escape typed by hand: \\u00c4\\u0085',
+    'double backslash \\\\u00e2 then ą',
+    '"quotes" and \\"escaped quotes\\" with ž',
+    'tab\tnew line\nž',
+    '',
+]
+
+
+# Writes the string the way the export does: decoded as if every UTF-8 byte was a character, then escaped by json
+def export_string(s):
+    return s.encode('utf-8').decode('latin-1')
+
+
+def parse_utf8_deep(value):
+    if isinstance(value, str):
+        return parse_utf8(value)
+    if isinstance(value, list):
+        return [parse_utf8_deep(x) for x in value]
+    if isinstance(value, dict):
+        return {parse_utf8_deep(key): parse_utf8_deep(val) for key, val in value.items()}
+    return value
+
+
+def make_export(strings):
+    return {
+        'participants': [{'name': export_string('Ąžuolaitė 😀')}, {'name': 'Me'}],
+        'title': export_string('Grupė 😀 Группа'),
+        'messages': [{'sender_name': export_string('Ąžuolaitė 😀'), 'timestamp_ms': 1000 * i, 'content': export_string(x)}
+                     for i, x in enumerate(strings)],
+    }
+
+
+@pytest.mark.parametrize('text', CORPUS)
+def test_single_string_matches_parse_utf8(text):
+    raw = json.dumps({'content': export_string(text)})
+    assert json.loads(fix_mojibake(raw)) == parse_utf8_deep(json.loads(raw)) == {'content': text}
+
+
+@pytest.mark.parametrize('indent', [None, 2])
+def test_whole_export_matches_parse_utf8(indent):
+    raw = json.dumps(make_export(CORPUS), indent=indent)
+    expected = parse_utf8_deep(json.loads(raw))
+    assert json.loads(fix_mojibake(raw)) == expected
+    assert [x['content'] for x in expected['messages']] == CORPUS
+
+
+def test_invalid_utf8_escapes_are_left_alone():
+    # Latin-1 text which isn't mojibake: the escapes don't form a valid UTF-8 sequence
+    raw = json.dumps({'content': 'café été'})
+    assert json.loads(fix_mojibake(raw)) == {'content': 'café été'}